@@ -1,65 +1,40 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import plotly.graph_objects as go
 import os
-import base64
 from datetime import datetime, timedelta
 import sys
+import logging
 
-# Function to convert image to base64 for HTML display
-def get_base64_image(image_path):
-    """Convert image file to base64 string for HTML embedding"""
-    try:
-        if os.path.exists(image_path):
-            with open(image_path, "rb") as image_file:
-                encoded_string = base64.b64encode(image_file.read()).decode()
-            return encoded_string
-        return ""
-    except Exception as e:
-        return ""
+# Quiet by default; LOG_LEVEL=DEBUG brings back the per-call database success messages
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "WARNING").upper())
+
+# Logo is served from ./static (see .streamlit/config.toml) so the browser can cache it
+LOGO_PATH = "static/logo.png"
+LOGO_URL = "app/static/logo.png"
 
 # This tells Python to look in the current folder for the 'utils' module
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Now your existing import will work
-from utils.database import init_db, verify_user, create_user, get_prediction_history
+from utils.database import ensure_db, verify_user, create_user, get_cached_prediction_history, load_or_stop
+from utils.charts import lttb_downsample
+from utils.styles import APP_CSS
 
 # Page configuration MUST be first
 st.set_page_config(
     page_title='Heart Disease Prevention',
-    page_icon="Cambodia Health Innovations Logo - Medical Cross and Circuit.png",
+    page_icon=LOGO_PATH,
     layout='wide',
     initial_sidebar_state='expanded'
 )
 
 # Initialize database
-init_db()
-
-# Custom CSS
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 2.5rem;
-        font-weight: bold;
-        color: #1f77b4;
-        text-align: center;
-        margin-bottom: 2rem;
-        margin-top: 1rem;
-    }
-    .metric-card {
-        background-color: #f0f2f6;
-        padding: 1rem;
-        border-radius: 0.5rem;
-        margin: 0.5rem 0;
-    }
-    .sidebar .sidebar-content {
-        padding-top: 1rem;
-    }
-    .stImage {
-        margin-bottom: 1rem;
-    }
-</style>
-""", unsafe_allow_html=True)
+ensure_db()
+
+# Custom CSS (prebuilt in utils.styles)
+st.markdown(APP_CSS, unsafe_allow_html=True)
 
 # Initialize session state
 if 'logged_in' not in st.session_state:
@@ -73,13 +48,11 @@ def login_ui():
     """Handles the Login/Signup views."""
     empty1, col1, empty2 = st.columns([1, 2, 1])
     with col1:
-        logo_b64 = get_base64_image("Cambodia Health Innovations Logo - Medical Cross and Circuit.png")
-        if logo_b64:
-            st.markdown(f"""
-            <div style="text-align: center; padding: 1rem;">
-                <img src="data:image/png;base64,{logo_b64}" style="width: 130px; height: auto; display: block; margin: 0 auto;">
-            </div>
-            """, unsafe_allow_html=True)
+        st.markdown(f"""
+        <div style="text-align: center; padding: 1rem;">
+            <img src="{LOGO_URL}" style="width: 130px; height: auto; display: block; margin: 0 auto;">
+        </div>
+        """, unsafe_allow_html=True)
 
     st.markdown('<p class="main-header">Welcome to Cambodia Health Innovation</p>', unsafe_allow_html=True)
     st.info("Please Log In or Sign Up to access the health management system.")
@@ -140,13 +113,11 @@ if not st.session_state.logged_in:
 
 # Logout Sidebar
 with st.sidebar:
-    logo_b64_sidebar = get_base64_image("Cambodia Health Innovations Logo - Medical Cross and Circuit.png")
-    if logo_b64_sidebar:
-        st.markdown(f"""
-        <div style="text-align: center; margin-bottom: 2.5rem; padding: 1rem;">
-            <img src="data:image/png;base64,{logo_b64_sidebar}" style="width: 110px; height: auto; display: block; margin: 0 auto;">
-        </div>
-        """, unsafe_allow_html=True)
+    st.markdown(f"""
+    <div style="text-align: center; margin-bottom: 2.5rem; padding: 1rem;">
+        <img src="{LOGO_URL}" style="width: 110px; height: auto; display: block; margin: 0 auto;">
+    </div>
+    """, unsafe_allow_html=True)
 
     st.title("Heart Health Management")
     st.write(f"Logged in as: **{st.session_state.username}**")
@@ -190,29 +161,30 @@ st.markdown("---")
 st.subheader("Health Trend Overview")
 
 # 1. Fetch the data
-data = get_prediction_history(st.session_state.user_id)
+data = load_or_stop(get_cached_prediction_history, st.session_state.user_id)
 
 if data:
     try:
         # 2. Convert list of tuples to DataFrame
         df = pd.DataFrame(data, columns=['predicted_target', 'probability', 'timestamp'])
         
-        # 3. Clean the Date
-        df['timestamp'] = pd.to_datetime(df['timestamp']).dt.tz_localize(None)
+        # 3. Clean the Date (column is a naive TIMESTAMP, so a direct numpy cast is enough)
+        df['timestamp'] = df['timestamp'].values.astype('datetime64[ns]')
         
-        # 4. Create the chart
-        import plotly.express as px
-        fig = px.line(
-            df, 
-            x='timestamp', 
-            y='probability',
-            title='Heart Disease Risk Trend',
-            markers=True,
-            template="plotly_white"
-        )
+        # 4. Create the chart (WebGL trace stays smooth as history grows)
+        trend_x, trend_y = lttb_downsample(df['timestamp'], df['probability'])
+        fig = go.Figure()
+        fig.add_trace(go.Scattergl(
+            x=trend_x,
+            y=trend_y,
+            mode='lines+markers',
+            name='Risk'
+        ))
         
         # 5. Format the look
         fig.update_layout(
+            title='Heart Disease Risk Trend',
+            template="plotly_white",
             yaxis_title="Risk Probability (0.0 - 1.0)",
             xaxis_title="Assessment Date",
             yaxis_range=[0, 1]
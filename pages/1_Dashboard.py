@@ -1,9 +1,9 @@
 # pages/dashboard.py
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta
 import plotly.graph_objects as go
-from utils.database import init_db, get_blood_pressure_data, get_activity_data
+from utils.database import ensure_db, get_cached_recent_blood_pressure, get_cached_recent_activities, get_cached_blood_pressure_daily, get_cached_activity_daily, get_cached_dashboard_summary, load_or_stop
+from utils.charts import lttb_downsample
 
 # Check if user is logged in
 if 'logged_in' not in st.session_state or not st.session_state.logged_in:
@@ -14,29 +14,18 @@ st.title("Health Dashboard")
 st.write(f"Welcome back, {st.session_state.username}!")
 
 # Initialize database
-init_db()
-
-def get_bp_data(user_id, days=30):
-    """Get BP data from database"""
-    df = get_blood_pressure_data(user_id)
-    if not df.empty:
-        cutoff = datetime.now() - timedelta(days=days)
-        df = df[df['timestamp'] >= cutoff]
-    return df
-
-def get_activity_data(user_id, days=30):
-    """Get activity data from database"""
-    # Import the database function to avoid recursion
-    from utils.database import get_activity_data as db_get_activity_data
-    df = db_get_activity_data(user_id)
-    if not df.empty:
-        cutoff = datetime.now() - timedelta(days=days)
-        df = df[df['timestamp'] >= cutoff]
-    return df
-
-# Load data
-bp_df = get_bp_data(st.session_state.user_id)
-activity_df = get_activity_data(st.session_state.user_id)
+ensure_db()
+
+def get_recent_bp(user_id, n=10, days=30):
+    """Most recent BP readings within the dashboard window for the Recent Data tab"""
+    return load_or_stop(get_cached_recent_blood_pressure, user_id, n, days)
+
+def get_recent_activity(user_id, n=10, days=30):
+    """Most recent activities within the dashboard window for the Recent Data tab"""
+    return load_or_stop(get_cached_recent_activities, user_id, n, with_notes=False, days=days)
+
+# Load data (headline metrics come from one aggregate query)
+summary = load_or_stop(get_cached_dashboard_summary, st.session_state.user_id)
 
 # Main metrics
 st.subheader("Overview")
@@ -44,45 +33,43 @@ st.subheader("Overview")
 col1, col2, col3 = st.columns(3)
 
 with col1:
-    if not bp_df.empty:
-        latest_bp = bp_df.iloc[0]
-        st.metric("Latest BP", f"{latest_bp['systolic']:.0f}/{latest_bp['diastolic']:.0f}")
+    if summary['latest_systolic'] is not None:
+        st.metric("Latest BP", f"{summary['latest_systolic']:.0f}/{summary['latest_diastolic']:.0f}")
     else:
         st.metric("Latest BP", "No data")
 
 with col2:
-    if not activity_df.empty:
-        week_activity = activity_df[activity_df['timestamp'] >= datetime.now() - timedelta(days=7)]
-        weekly_min = week_activity['duration'].sum() if not week_activity.empty else 0
-        st.metric("Weekly Activity", f"{weekly_min:.0f} min")
+    if summary['activity_count']:
+        st.metric("Weekly Activity", f"{summary['weekly_minutes']:.0f} min")
     else:
         st.metric("Weekly Activity", "No data")
 
 with col3:
-    total_records = len(bp_df) + len(activity_df)
+    total_records = summary['bp_count'] + summary['activity_count']
     st.metric("Total Records", total_records)
 
 # Charts section
 st.subheader("Trends")
 
-if not bp_df.empty or not activity_df.empty:
+if summary['bp_count'] or summary['activity_count']:
     fig = go.Figure()
     
-    # Add BP trend
-    if not bp_df.empty:
-        bp_daily = bp_df.groupby(bp_df['timestamp'].dt.date)['systolic'].mean().reset_index()
-        fig.add_trace(go.Scatter(
-            x=bp_daily['timestamp'],
-            y=bp_daily['systolic'],
+    # Add BP trend (daily averages come pre-aggregated from SQL)
+    bp_daily = load_or_stop(get_cached_blood_pressure_daily, st.session_state.user_id) if summary['bp_count'] else pd.DataFrame()
+    if not bp_daily.empty:
+        bp_x, bp_y = lttb_downsample(bp_daily['day'], bp_daily['systolic'])
+        fig.add_trace(go.Scattergl(
+            x=bp_x,
+            y=bp_y,
             name='Blood Pressure',
             line=dict(color='red', width=2)
         ))
     
     # Add activity trend
-    if not activity_df.empty:
-        activity_daily = activity_df.groupby(activity_df['timestamp'].dt.date)['duration'].sum().reset_index()
+    activity_daily = load_or_stop(get_cached_activity_daily, st.session_state.user_id) if summary['activity_count'] else pd.DataFrame()
+    if not activity_daily.empty:
         fig.add_trace(go.Bar(
-            x=activity_daily['timestamp'],
+            x=activity_daily['day'],
             y=activity_daily['duration'],
             name='Activity (min)',
             marker_color='green',
@@ -103,14 +90,16 @@ st.subheader("Recent Data")
 tab1, tab2 = st.tabs(["Blood Pressure", "Activity"])
 
 with tab1:
+    bp_df = get_recent_bp(st.session_state.user_id) if summary['bp_count'] else pd.DataFrame()
     if not bp_df.empty:
-        st.dataframe(bp_df.head(10)[['timestamp', 'systolic', 'diastolic', 'heart_rate']])
+        st.dataframe(bp_df[['timestamp', 'systolic', 'diastolic', 'heart_rate']])
     else:
         st.info("No blood pressure data available")
 
 with tab2:
+    activity_df = get_recent_activity(st.session_state.user_id) if summary['activity_count'] else pd.DataFrame()
     if not activity_df.empty:
-        st.dataframe(activity_df.head(10)[['timestamp', 'activity_type', 'duration', 'calories']])
+        st.dataframe(activity_df[['timestamp', 'activity_type', 'duration', 'calories']])
     else:
         st.info("No activity data available")
 
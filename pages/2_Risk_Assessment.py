@@ -3,8 +3,9 @@ import pandas as pd
 import numpy as np
 import os
 import joblib
+from collections import namedtuple
 from datetime import datetime
-from utils.database import get_connection, log_prediction_to_db, get_prediction_history
+from utils.database import get_connection, log_prediction_to_db, get_cached_prediction_history, DataUnavailable
 
 # --- 1. AUTHENTICATION ---
 if 'logged_in' not in st.session_state or not st.session_state.logged_in:
@@ -25,30 +26,37 @@ FEATURE_NAMES_PATH = os.path.join(MODEL_DIR, 'feature_names.pkl')
 def get_recent_logs(user_id):
     """Fetches history for the specific logged-in user"""
     try:
-        data = get_prediction_history(user_id)
+        data = get_cached_prediction_history(user_id)
         if data:
+            # psycopg2 already returns datetime objects, which pandas stores as datetime64 directly
             df = pd.DataFrame(data, columns=['predicted_target', 'probability', 'timestamp'])
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            # Add dummy columns to match expected format
-            df['age'] = None
-            df['resting_bp_s'] = None  
-            df['cholesterol'] = None
-            return df[['timestamp', 'age', 'resting_bp_s', 'cholesterol', 'predicted_target', 'probability']]
+            return df[['timestamp', 'predicted_target', 'probability']]
+        return pd.DataFrame()
+    except DataUnavailable:
+        st.error("Couldn't load your assessment history right now.")
         return pd.DataFrame()
     except:
         return pd.DataFrame()
 
 # --- 4. LOAD TRAINED ASSETS ---
-@st.cache_resource
-def load_trained_assets():
-    if not os.path.exists(MODEL_PATH):
-        return None
+ModelAssets = namedtuple("ModelAssets", ["model", "scaler", "features", "scale_mean", "scale_std"])
+
+@st.cache_resource(max_entries=1)
+def load_trained_assets(model_mtime):
+    """Load model artifacts; model_mtime keys the cache so a retrained model is picked up and the old one evicted"""
     try:
-        return {
-            "model": joblib.load(MODEL_PATH),
-            "scaler": joblib.load(SCALER_PATH),
-            "features": joblib.load(FEATURE_NAMES_PATH)
-        }
+        scaler = joblib.load(SCALER_PATH)
+        assets = ModelAssets(
+            model=joblib.load(MODEL_PATH, mmap_mode='r'),
+            scaler=scaler,
+            features=joblib.load(FEATURE_NAMES_PATH),
+            # StandardScaler parameters, applied directly in numpy on each prediction
+            scale_mean=np.asarray(scaler.mean_, dtype=np.float32),
+            scale_std=np.asarray(scaler.scale_, dtype=np.float32)
+        )
+        # Warm the predict path once so the first real submit doesn't pay for it
+        assets.model.predict_proba(np.zeros((1, len(assets.features)), dtype=np.float32))
+        return assets
     except Exception as e:
         st.error(f"Error loading model assets: {e}")
         return None
@@ -57,7 +65,7 @@ def load_trained_assets():
 def render_risk_assessment():
     st.title("Heart Disease Risk Assessment")
     
-    assets = load_trained_assets()
+    assets = load_trained_assets(os.path.getmtime(MODEL_PATH)) if os.path.exists(MODEL_PATH) else None
     if not assets:
         st.error(f"Critical Error: Model files not found in {MODEL_DIR}")
         return
@@ -85,14 +93,15 @@ def render_risk_assessment():
 
         if st.form_submit_button("Predict Risk", type="primary"):
             try:
-                # Prepare data
-                input_df = pd.DataFrame([[age, sex, cp, bp, chol, fbs, ecg, max_hr, exang, oldpeak, slope]], 
-                                        columns=assets['features'])
+                # Prepare data (single row in feature order, no DataFrame needed)
+                input_row = np.array([[age, sex, cp, bp, chol, fbs, ecg, max_hr, exang, oldpeak, slope]], 
+                                     dtype=np.float32)
                 
-                # Scale and Predict
-                scaled_data = assets['scaler'].transform(input_df)
-                prediction = int(assets['model'].predict(scaled_data)[0])
-                probability = float(assets['model'].predict_proba(scaled_data)[0][1])
+                # Scale in numpy (skips sklearn input validation), then one predict_proba pass
+                scaled_data = (input_row - assets.scale_mean) / assets.scale_std
+                proba = assets.model.predict_proba(scaled_data)[0]
+                prediction = int(assets.model.classes_[proba.argmax()])
+                probability = float(proba[1])
                 
                 # Save results to Shared Database
                 log_prediction_to_db(st.session_state.user_id, age, chol, bp, prediction, probability)
@@ -113,9 +122,13 @@ def render_risk_assessment():
     
     if not history.empty:
         # Clean labels (no emojis)
-        history['Result'] = history['predicted_target'].apply(lambda x: "High Risk" if x == 1 else "Low Risk")
-        history['Risk %'] = (history['probability'] * 100).round(1).astype(str) + '%'
-        st.dataframe(history[['timestamp', 'age', 'Result', 'Risk %']], use_container_width=True)
+        history['Result'] = np.where(history['predicted_target'].values == 1, "High Risk", "Low Risk")
+        history['Risk %'] = history['probability'].values * 100
+        st.dataframe(
+            history[['timestamp', 'Result', 'Risk %']],
+            use_container_width=True,
+            column_config={'Risk %': st.column_config.NumberColumn('Risk %', format='%.1f%%')}
+        )
     else:
         st.info("No previous assessment data found.")
 
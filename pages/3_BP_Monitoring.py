@@ -1,9 +1,12 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
 import plotly.graph_objects as go
 import plotly.express as px
-from utils.database import init_db, save_blood_pressure, get_blood_pressure_data
+from utils.database import ensure_db, save_blood_pressure, get_cached_blood_pressure_data, load_or_stop
+from utils.charts import lttb_downsample
+from utils.frames import slice_since
 import warnings
 
 # Check if user is logged in
@@ -19,7 +22,7 @@ if 'user_id' not in st.session_state or st.session_state.user_id is None:
 st.markdown('<h1 style="text-align: center; color: #1f77b4;">Blood Pressure Monitor</h1>', unsafe_allow_html=True)
 
 # Initialize database
-init_db()
+ensure_db()
 
 def classify_bp(systolic, diastolic):
     """Classify BP according to AHA guidelines"""
@@ -54,29 +57,70 @@ def classify_bp(systolic, diastolic):
             "advice": "EMERGENCY! Seek immediate medical care. Call emergency services if experiencing symptoms."
         }
 
+# Category labels indexed by the bucket numbers produced in classify_bp_vec
+BP_CATEGORY_LABELS = np.array(["Normal", "Elevated", "High BP - Stage 1", "High BP - Stage 2", "Hypertensive Crisis"])
+
+def classify_bp_vec(sys_arr, dia_arr):
+    """Vectorized classify_bp: category label for every reading in one pass"""
+    sys_arr = np.asarray(sys_arr)
+    dia_arr = np.asarray(dia_arr)
+    # Same thresholds as classify_bp, reduced to an integer bucket and looked up in one gather
+    bucket = np.where((sys_arr < 120) & (dia_arr < 80), 0,
+             np.where((sys_arr < 130) & (dia_arr < 80), 1,
+             np.where((sys_arr < 140) | (dia_arr < 90), 2,
+             np.where((sys_arr < 180) & (dia_arr < 120), 3, 4))))
+    return BP_CATEGORY_LABELS[bucket]
+
+# History tab periods mapped to a look-back window in days (None = all time)
+HISTORY_PERIOD_DAYS = {
+    "Last 7 Days": 7,
+    "Last 30 Days": 30,
+    "Last 3 Months": 90,
+    "All Time": None
+}
+
+# Rows per page in the History tab's detailed records table
+HISTORY_PAGE_SIZE = 500
+
 def get_bp_data(user_id, limit=None):
-    """Retrieve BP data from database"""
-    return get_blood_pressure_data(user_id, limit)
+    """Retrieve BP data from the per-user cache; views narrow it by period with slice_since"""
+    df = load_or_stop(get_cached_blood_pressure_data, user_id)
+    return df.head(limit) if limit else df
 
 def calculate_bp_trends(bp_df):
     """Calculate BP trends and statistics"""
     if bp_df.empty or len(bp_df) < 2:
         return None
     
-    now = datetime.now()
-    last_7_days = bp_df[bp_df['timestamp'] >= now - timedelta(days=7)]
-    prev_7_days = bp_df[(bp_df['timestamp'] >= now - timedelta(days=14)) & 
-                        (bp_df['timestamp'] < now - timedelta(days=7))]
+    # Pull the columns out as numpy arrays once
+    ts = bp_df['timestamp'].values.astype('datetime64[s]')
+    sys_arr = bp_df['systolic'].to_numpy(dtype=float)
+    dia_arr = bp_df['diastolic'].to_numpy(dtype=float)
+    hour = (ts - ts.astype('datetime64[D]')).astype('timedelta64[h]').astype(int)
+    
+    now = np.datetime64(datetime.now(), 's')
+    week_ago = now - np.timedelta64(7, 'D')
+    
+    # Bucket each reading once (0 = this week, 1 = previous week, 2 = older;
+    # 0 = morning, 1 = afternoon, 2 = evening) and aggregate every bucket with
+    # a single bincount instead of one masked mean per window
+    window = np.where(ts >= week_ago, 0, np.where(ts >= week_ago - np.timedelta64(7, 'D'), 1, 2))
+    daypart = np.where(hour < 12, 0, np.where(hour >= 18, 2, 1))
+    win_n = np.bincount(window, minlength=3)
+    win_sys = np.bincount(window, weights=sys_arr, minlength=3)
+    win_dia = np.bincount(window, weights=dia_arr, minlength=3)
+    part_n = np.bincount(daypart, minlength=3)
+    part_sys = np.bincount(daypart, weights=sys_arr, minlength=3)
     
     trends = {
-        'current_avg_systolic': last_7_days['systolic'].mean() if not last_7_days.empty else 0,
-        'current_avg_diastolic': last_7_days['diastolic'].mean() if not last_7_days.empty else 0,
-        'prev_avg_systolic': prev_7_days['systolic'].mean() if not prev_7_days.empty else 0,
-        'prev_avg_diastolic': prev_7_days['diastolic'].mean() if not prev_7_days.empty else 0,
+        'current_avg_systolic': win_sys[0] / win_n[0] if win_n[0] else 0,
+        'current_avg_diastolic': win_dia[0] / win_n[0] if win_n[0] else 0,
+        'prev_avg_systolic': win_sys[1] / win_n[1] if win_n[1] else 0,
+        'prev_avg_diastolic': win_dia[1] / win_n[1] if win_n[1] else 0,
         'total_readings': len(bp_df),
-        'readings_this_week': len(last_7_days),
-        'morning_avg': bp_df[bp_df['timestamp'].dt.hour < 12]['systolic'].mean() if not bp_df.empty else 0,
-        'evening_avg': bp_df[bp_df['timestamp'].dt.hour >= 18]['systolic'].mean() if not bp_df.empty else 0
+        'readings_this_week': int(win_n[0]),
+        'morning_avg': part_sys[0] / part_n[0] if part_n[0] else np.nan,
+        'evening_avg': part_sys[2] / part_n[2] if part_n[2] else np.nan
     }
     
     if trends['prev_avg_systolic'] > 0:
@@ -88,11 +132,45 @@ def calculate_bp_trends(bp_df):
     
     return trends
 
-# Create tabs
-tab1, tab2, tab3, tab4 = st.tabs(["Log Reading", "Dashboard", "History & Trends", "Insights"])
+def get_bp_trends(bp_df, view):
+    """calculate_bp_trends memoized in session state, one entry per view, keyed on the frame's size, newest reading and today's date"""
+    if bp_df.empty:
+        return None
+    key = (st.session_state.user_id, len(bp_df), bp_df['timestamp'].iat[0], datetime.now().date())
+    cache = st.session_state.setdefault('bp_trends_cache', {})
+    cached_key, trends = cache.get(view, (None, None))
+    if cached_key != key:
+        # Replace rather than add, so the cache never holds more than one result per view
+        trends = calculate_bp_trends(bp_df)
+        cache[view] = (key, trends)
+    return trends
+
+def render_latest_reading(latest):
+    """Render the Latest Reading header and card from a reading row (Series or dict)"""
+    classification = classify_bp(latest['systolic'], latest['diastolic'])
+    # Convert UTC timestamp to local time for display
+    utc_timestamp = latest['timestamp']
+    local_timestamp = utc_timestamp  # For now, keep as UTC since we can't determine user's timezone server-side
+    
+    st.markdown(f"""
+    ### Latest Reading - <span id="timestamp-display" data-utc="{utc_timestamp.strftime('%Y-%m-%dT%H:%M:%S')}Z">{utc_timestamp.strftime('%b %d, %Y at %I:%M %p')}</span>
+    """, unsafe_allow_html=True)
+    
+    heart_rate_display = f"{latest['heart_rate']:.0f} bpm" if not pd.isna(latest['heart_rate']) else "Not recorded"
+    
+    st.markdown(f"""
+        <div style="background: linear-gradient(135deg, #1f77b4 0%, #124e78 100%); 
+                    padding: 2rem; border-radius: 15px; color: white;">
+            <h2 style="margin:0;">{latest['systolic']:.0f}/{latest['diastolic']:.0f} mmHg</h2>
+            <p style="margin:0.5rem 0 0 0; font-size: 1.2rem;">{classification['category']}</p>
+            <p style="margin:0.5rem 0 0 0;">Heart Rate: {heart_rate_display}</p>
+        </div>
+        """, unsafe_allow_html=True)
 
 # TAB 1: LOG READING
-with tab1:
+@st.fragment
+def log_reading_tab():
+    """Tab 1 body; as a fragment, saving a reading reruns only this block"""
     st.subheader("Log Blood Pressure Reading")
     
     col1, col2, col3 = st.columns(3)
@@ -115,12 +193,14 @@ with tab1:
         reading_datetime = datetime.combine(reading_date, reading_time)
         classification = classify_bp(systolic, diastolic)
         
-        # Save to database
-        if save_blood_pressure(st.session_state.user_id, systolic, diastolic, heart_rate, notes):
+        # Save to database; the inserted row comes back so no re-fetch is needed
+        saved = save_blood_pressure(st.session_state.user_id, systolic, diastolic, heart_rate, notes)
+        if saved:
+            st.session_state.pop('bp_trends_cache', None)
             st.success("Blood pressure reading saved successfully!")
         else:
             st.error("Failed to save reading.")
-            st.stop()
+            return
         
         st.markdown("---")
         st.markdown(f"### Result: {classification['category']}")
@@ -131,15 +211,31 @@ with tab1:
             st.warning(classification['advice'])
         else:
             st.error(classification['advice'])
-        st.rerun()
+        
+        render_latest_reading(saved)
+
+# View selector: unlike st.tabs, only the selected branch below is executed
+active_view = st.radio(
+    "View",
+    ["Log Reading", "Dashboard", "History & Trends", "Insights"],
+    horizontal=True,
+    key="bp_active_view",
+    label_visibility="collapsed"
+)
+
+# Load the user's readings once per rerun, only for views that show them
+bp_history = get_bp_data(st.session_state.user_id) if active_view != "Log Reading" else None
+
+if active_view == "Log Reading":
+    log_reading_tab()
 
 # TAB 2: DASHBOARD
-with tab2:
+elif active_view == "Dashboard":
     st.subheader("Your BP Dashboard")
-    bp_df = get_bp_data(st.session_state.user_id, limit=30)
+    bp_df = bp_history.head(30)
     
     if not bp_df.empty:
-        trends = calculate_bp_trends(bp_df)
+        trends = get_bp_trends(bp_df, "Dashboard")
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
@@ -156,63 +252,51 @@ with tab2:
             st.metric("Total Readings", len(bp_df))
         
         st.markdown("---")
-        latest = bp_df.iloc[0]
-        classification = classify_bp(latest['systolic'], latest['diastolic'])
-        # Convert UTC timestamp to local time for display
-        utc_timestamp = latest['timestamp']
-        local_timestamp = utc_timestamp  # For now, keep as UTC since we can't determine user's timezone server-side
-        
-        st.markdown(f"""
-        ### Latest Reading - <span id="timestamp-display" data-utc="{utc_timestamp.strftime('%Y-%m-%dT%H:%M:%S')}Z">{utc_timestamp.strftime('%b %d, %Y at %I:%M %p')}</span>
-        """, unsafe_allow_html=True)
-        
-        heart_rate_display = f"{latest['heart_rate']:.0f} bpm" if latest['heart_rate'] is not None else "Not recorded"
-        
-        st.markdown(f"""
-            <div style="background: linear-gradient(135deg, #1f77b4 0%, #124e78 100%); 
-                        padding: 2rem; border-radius: 15px; color: white;">
-                <h2 style="margin:0;">{latest['systolic']:.0f}/{latest['diastolic']:.0f} mmHg</h2>
-                <p style="margin:0.5rem 0 0 0; font-size: 1.2rem;">{classification['category']}</p>
-                <p style="margin:0.5rem 0 0 0;">Heart Rate: {heart_rate_display}</p>
-            </div>
-            """, unsafe_allow_html=True)
+        render_latest_reading(bp_df.iloc[0])
     else:
         st.info("No readings yet. Start by logging your first reading in the 'Log Reading' tab.")
 
 # TAB 3: HISTORY & TRENDS
-with tab3:
+elif active_view == "History & Trends":
     st.subheader("Blood Pressure History & Trends")
-    bp_df = get_bp_data(st.session_state.user_id)
+    bp_df = bp_history
     if not bp_df.empty:
-        period = st.selectbox("Time Period", ["Last 7 Days", "Last 30 Days", "Last 3 Months", "All Time"])
+        period = st.selectbox("Time Period", list(HISTORY_PERIOD_DAYS))
         
-        # Filtering logic
-        now = datetime.now()
-        if period == "Last 7 Days":
-            filtered_df = bp_df[bp_df['timestamp'] >= now - timedelta(days=7)]
-        elif period == "Last 30 Days":
-            filtered_df = bp_df[bp_df['timestamp'] >= now - timedelta(days=30)]
-        else:
-            filtered_df = bp_df
+        # Filtering logic (rows are newest-first, so the window is a leading slice)
+        period_days = HISTORY_PERIOD_DAYS[period]
+        filtered_df = slice_since(bp_df, datetime.now() - timedelta(days=period_days)) if period_days else bp_df
         
         if not filtered_df.empty:
             fig = go.Figure()
-            fig.add_trace(go.Scatter(x=filtered_df['timestamp'], y=filtered_df['systolic'], name='Systolic', line=dict(color='#e74c3c')))
-            fig.add_trace(go.Scatter(x=filtered_df['timestamp'], y=filtered_df['diastolic'], name='Diastolic', line=dict(color='#3498db')))
+            # Long histories are LTTB-downsampled so the browser only gets ~2k points per trace
+            sys_x, sys_y = lttb_downsample(filtered_df['timestamp'], filtered_df['systolic'])
+            dia_x, dia_y = lttb_downsample(filtered_df['timestamp'], filtered_df['diastolic'])
+            fig.add_trace(go.Scattergl(x=sys_x, y=sys_y, name='Systolic', line=dict(color='#e74c3c')))
+            fig.add_trace(go.Scattergl(x=dia_x, y=dia_y, name='Diastolic', line=dict(color='#3498db')))
+            # Keep pan/zoom state across reruns; declare the date axis to skip type autodetection
+            fig.update_layout(uirevision='bp', xaxis_type='date')
             st.plotly_chart(fig, use_container_width=True)
             
             st.subheader("Detailed Records")
-            st.dataframe(filtered_df[['timestamp', 'systolic', 'diastolic', 'heart_rate', 'category', 'notes']], use_container_width=True)
+            # Only the visible page is materialized and sent to the browser
+            max_pages = -(-len(filtered_df) // HISTORY_PAGE_SIZE)
+            page = st.number_input("Page", 1, max_pages, 1) if max_pages > 1 else 1
+            view = filtered_df.iloc[(page - 1) * HISTORY_PAGE_SIZE:page * HISTORY_PAGE_SIZE]
+            view = view[['timestamp', 'systolic', 'diastolic', 'heart_rate', 'notes']].assign(
+                category=classify_bp_vec(view['systolic'], view['diastolic'])
+            )
+            st.dataframe(view[['timestamp', 'systolic', 'diastolic', 'heart_rate', 'category', 'notes']], hide_index=True, use_container_width=True)
     else:
         st.info("No data available yet.")
 
 # TAB 4: INSIGHTS
-with tab4:
+elif active_view == "Insights":
     st.subheader("Personalized Insights")
-    bp_df = get_bp_data(st.session_state.user_id)
+    bp_df = bp_history
     
     if not bp_df.empty and len(bp_df) >= 3:
-        trends = calculate_bp_trends(bp_df)
+        trends = get_bp_trends(bp_df, "Insights")
         if trends:
             if trends['systolic_change'] < -3:
                 st.success(f"### Great Progress!\nYour average systolic BP has decreased by {abs(trends['systolic_change']):.1f} mmHg this week.")
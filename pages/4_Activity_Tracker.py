@@ -1,10 +1,16 @@
 # pages/activity_tracker.py
 import streamlit as st
+import html
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
 import plotly.express as px
 import plotly.graph_objects as go
-from utils.database import init_db, save_activity, get_activity_data
+from utils.activity import MET_VALUES, MET_KEYS, INTENSITY_INDICATORS
+from utils.frames import slice_since
+from utils.csv_import import read_upload, parse_timestamps, parse_numbers, parse_choice, parse_text, valid_rows, to_records, skipped_message
+from utils.database import ensure_db, save_activity, bulk_insert_activities, get_cached_activity_data, get_cached_activity_summary, get_cached_recent_activities, load_or_stop
 
 # Check if user is logged in
 if 'logged_in' not in st.session_state or not st.session_state.logged_in:
@@ -19,39 +25,10 @@ if 'user_id' not in st.session_state or st.session_state.user_id is None:
 st.markdown('<h1 style="text-align: center; color: #1f77b4;">Physical Activity Tracker</h1>', unsafe_allow_html=True)
 
 # Initialize database
-init_db()
+ensure_db()
 
-# MET (Metabolic Equivalent) values for different activities
-MET_VALUES = {
-    "Walking (Casual)": 3.5,
-    "Walking (Brisk)": 4.5,
-    "Running (Light)": 8.0,
-    "Running (Fast)": 11.0,
-    "Cycling (Casual)": 6.0,
-    "Cycling (Vigorous)": 10.0,
-    "Swimming": 7.0,
-    "Yoga": 2.5,
-    "Gym (Weight Training)": 5.0,
-    "Gym (Cardio)": 7.0,
-    "Dancing": 5.5,
-    "Hiking": 6.5,
-    "Basketball": 8.0,
-    "Football/Soccer": 10.0,
-    "Tennis": 7.0,
-    "Golf": 4.3,
-    "Gardening": 4.0,
-    "Cleaning": 3.5,
-    "Stairs": 8.0,
-    "Jump Rope": 12.0,
-    "Other": 5.0
-}
-
-# Intensity indicators without emojis
-INTENSITY_INDICATORS = {
-    "Light": "[L]",
-    "Moderate": "[M]",
-    "Vigorous": "[V]"
-}
+# One clock read per rerun, shared by the form defaults and every date filter below
+NOW = datetime.now()
 
 def estimate_calories(activity, duration_min, weight_kg):
     """Calculate calories burned using MET formula"""
@@ -61,18 +38,33 @@ def estimate_calories(activity, duration_min, weight_kg):
     return round(calories, 1)
 
 def get_user_activity_data(user_id):
-    """Get activity data for user"""
-    return get_activity_data(user_id)
+    """Get activity data for user from the per-user cache"""
+    return load_or_stop(get_cached_activity_data, user_id)
 
-def calculate_weekly_goal_progress(activity_df):
-    """Calculate progress towards WHO 150min/week goal"""
-    now = datetime.now()
+def get_recent_activities(user_id, n=5):
+    """Get the user's n most recent activities without loading the full history"""
+    return load_or_stop(get_cached_recent_activities, user_id, n)
+
+def get_user_timezone():
+    """Browser timezone, resolved once per session (falls back to UTC)"""
+    if 'user_tz' not in st.session_state:
+        try:
+            st.session_state.user_tz = ZoneInfo(st.context.timezone or "UTC")
+        except Exception:
+            st.session_state.user_tz = ZoneInfo("UTC")
+    return st.session_state.user_tz
+
+def get_user_activity_summary(user_id, now=None):
+    """Get overall and this-week activity totals (aggregated in SQL) for user"""
+    now = now or datetime.now()
     week_start = now - timedelta(days=now.weekday())
     # Reset time to start of day
     week_start = week_start.replace(hour=0, minute=0, second=0, microsecond=0)
-    this_week = activity_df[activity_df['timestamp'] >= week_start]
-    
-    total_min = this_week['duration'].sum() if not this_week.empty else 0
+    return load_or_stop(get_cached_activity_summary, user_id, week_start)
+
+def calculate_weekly_goal_progress(summary):
+    """Calculate progress towards WHO 150min/week goal"""
+    total_min = float(summary['week_minutes'])
     goal = 150  # WHO recommendation
     progress = min((total_min / goal) * 100, 100)
     
@@ -81,9 +73,49 @@ def calculate_weekly_goal_progress(activity_df):
         'goal': goal,
         'progress': progress,
         'remaining': max(goal - total_min, 0),
-        'days_active': this_week['timestamp'].dt.date.nunique() if not this_week.empty else 0
+        'days_active': summary['week_days_active']
     }
 
+ACTIVITY_IMPORT_COLUMNS = ['timestamp', 'activity_type', 'duration', 'intensity', 'calories', 'notes']
+
+def parse_activity_csv(uploaded_file, weight_kg):
+    """(rows for bulk_insert_activities, skipped CSV line numbers) from a CSV with
+    timestamp,activity_type,duration,intensity[,calories,notes]"""
+    required = ('timestamp', 'activity_type', 'duration', 'intensity')
+    raw = read_upload(uploaded_file, required, ('calories', 'notes'))
+    # Same choices and bounds as the Log Activity form
+    activities = raw.assign(
+        timestamp=parse_timestamps(raw['timestamp']),
+        activity_type=parse_choice(raw['activity_type'], MET_VALUES),
+        duration=parse_numbers(raw['duration'], 1, 300),
+        intensity=parse_choice(raw['intensity'], INTENSITY_INDICATORS),
+        calories=parse_numbers(raw['calories'], 0, 2000),
+        notes=parse_text(raw['notes'])
+    )
+    activities, skipped = valid_rows(raw, activities, required, optional=('calories',))
+    # Fill missing calories with the MET estimate for every row at once
+    estimated = (activities['activity_type'].map(MET_VALUES).astype(float) * weight_kg * activities['duration'] / 60).round(1)
+    activities = activities.assign(calories=activities['calories'].fillna(estimated))
+    return to_records(activities, ACTIVITY_IMPORT_COLUMNS), skipped
+
+def import_activity_csv(user_id, uploaded_file, weight_kg):
+    """Parse, validate and bulk-load an activity history CSV, reporting the outcome on the page"""
+    try:
+        rows, skipped = parse_activity_csv(uploaded_file, weight_kg)
+    except ValueError as e:
+        st.error(f"Could not read CSV: {e}")
+        return
+    if skipped:
+        st.warning(skipped_message(skipped))
+    if not rows:
+        st.error("No valid activities to import.")
+        return
+    count = bulk_insert_activities(user_id, rows)
+    if count is False:
+        st.error("Import failed. Please check the file and try again.")
+    else:
+        st.success(f"Imported {count} activities.")
+
 def get_user_weight():
     """Get user weight from profile or use default"""
     if 'user_weight' not in st.session_state:
@@ -98,17 +130,18 @@ with tab1:
     st.subheader("Log Physical Activity")
     
     # User weight setting (for calorie calculation)
+    user_weight = get_user_weight()
     with st.expander("Profile Settings"):
         weight = st.number_input(
             "Your Weight (kg)",
             min_value=30.0,
             max_value=200.0,
-            value=get_user_weight(),
+            value=user_weight,
             step=0.5,
             help="Used for calorie calculation"
         )
         if st.button("Save Weight"):
-            st.session_state.user_weight = weight
+            st.session_state.user_weight = user_weight = weight
             st.success("Weight updated successfully!")
     
     st.markdown("---")
@@ -118,7 +151,7 @@ with tab1:
     with col1:
         activity_type = st.selectbox(
             "Activity Type",
-            list(MET_VALUES.keys()),
+            MET_KEYS,
             help="Select the activity you performed"
         )
         
@@ -130,7 +163,7 @@ with tab1:
             step=5
         )
         
-        activity_date = st.date_input("Date", datetime.now())
+        activity_date = st.date_input("Date", NOW)
     
     with col2:
         intensity = st.select_slider(
@@ -141,7 +174,7 @@ with tab1:
         )
         
         # Auto-calculate calories
-        estimated_cal = estimate_calories(activity_type, duration, get_user_weight())
+        estimated_cal = estimate_calories(activity_type, duration, user_weight)
         calories = st.number_input(
             "Calories Burned",
             min_value=0,
@@ -150,7 +183,7 @@ with tab1:
             help=f"Auto-calculated: {estimated_cal:.0f} cal"
         )
         
-        activity_time = st.time_input("Time", datetime.now().time())
+        activity_time = st.time_input("Time", NOW.time())
     
     notes = st.text_area(
         "Notes (optional)",
@@ -171,16 +204,22 @@ with tab1:
                 st.error("Failed to save activity.")
         except Exception as e:
             st.error(f"Error saving activity: {str(e)}")
+    
+    with st.expander("Import activity history (CSV)"):
+        st.caption("Columns: timestamp, activity_type, duration, intensity, and optionally calories, notes")
+        uploaded_file = st.file_uploader("Activity history CSV", type="csv", label_visibility="collapsed")
+        if uploaded_file and st.button("Import Activities"):
+            import_activity_csv(st.session_state.user_id, uploaded_file, user_weight)
 
 # TAB 2: DASHBOARD
 with tab2:
     st.subheader("Your Activity Dashboard")
     
-    activity_df = get_user_activity_data(st.session_state.user_id)
+    summary = get_user_activity_summary(st.session_state.user_id, NOW)
     
-    if not activity_df.empty:
+    if summary and summary['total_activities']:
         # Weekly goal progress
-        weekly_stats = calculate_weekly_goal_progress(activity_df)
+        weekly_stats = calculate_weekly_goal_progress(summary)
         
         st.markdown("### This Week's Progress")
         
@@ -232,19 +271,19 @@ with tab2:
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            total_activities = len(activity_df)
+            total_activities = summary['total_activities']
             st.metric("Total Activities", total_activities)
         
         with col2:
-            total_minutes = activity_df['duration'].sum()
+            total_minutes = float(summary['total_minutes'])
             st.metric("Total Time", f"{total_minutes:.0f} min")
         
         with col3:
-            total_calories = activity_df['calories'].sum()
+            total_calories = float(summary['total_calories'])
             st.metric("Total Calories", f"{total_calories:,.0f}")
         
         with col4:
-            avg_duration = activity_df['duration'].mean()
+            avg_duration = float(summary['avg_duration'])
             st.metric("Avg Duration", f"{avg_duration:.0f} min")
         
         st.markdown("---")
@@ -252,31 +291,22 @@ with tab2:
         # Recent activities
         st.markdown("### Recent Activities")
         
-        recent_df = activity_df.head(5)
-        for idx, row in recent_df.iterrows():
-            with st.container():
-                col1, col2, col3, col4 = st.columns([3, 2, 2, 1])
-                
-                with col1:
-                    st.markdown(f"**{row['activity_type']}**")
-                    utc_timestamp = row['timestamp']
-                    st.caption(f"""
-                    <span class="timestamp-display" data-utc="{utc_timestamp.strftime('%Y-%m-%dT%H:%M:%S')}Z">{utc_timestamp.strftime('%b %d, %Y at %I:%M %p')} UTC</span>
-                    """, unsafe_allow_html=True)
-                
-                with col2:
-                    st.markdown(f"Duration: {row['duration']:.0f} min")
-                
-                with col3:
-                    st.markdown(f"Calories: {row['calories']:.0f}")
-                
-                with col4:
-                    st.markdown(INTENSITY_INDICATORS.get(row['intensity'], "[?]"))
-                
-                if row['notes']:
-                    st.caption(f"Notes: {row['notes']}")
-                
-                st.divider()
+        recent_df = get_recent_activities(st.session_state.user_id, 5)
+        user_tz = get_user_timezone()
+        for row in recent_df.itertuples(index=False):
+            # One HTML block (a single delta) per row instead of columns + four writes
+            local_timestamp = row.timestamp.tz_localize('UTC').tz_convert(user_tz)
+            notes_html = f"<br><small>Notes: {html.escape(str(row.notes))}</small>" if row.notes else ""
+            st.markdown(
+                '<div style="padding: 0.5rem 0; border-bottom: 1px solid #e6e6e6;">'
+                f"<b>{html.escape(str(row.activity_type))}</b> &middot; "
+                f"Duration: {row.duration:.0f} min &middot; "
+                f"Calories: {row.calories:.0f} &middot; "
+                f"{INTENSITY_INDICATORS.get(row.intensity, '[?]')}<br>"
+                f'<small style="color: #808495;">{local_timestamp.strftime("%b %d, %Y at %I:%M %p")}</small>'
+                f"{notes_html}</div>",
+                unsafe_allow_html=True
+            )
         
     else:
         st.info("No activities logged yet. Start by logging your first activity!")
@@ -307,23 +337,22 @@ with tab3:
         )
         
         # Filter data
-        now = datetime.now()
         if period == "Last 7 Days":
-            filtered_df = activity_df[activity_df['timestamp'] >= now - timedelta(days=7)]
+            filtered_df = slice_since(activity_df, NOW - timedelta(days=7))
         elif period == "Last 30 Days":
-            filtered_df = activity_df[activity_df['timestamp'] >= now - timedelta(days=30)]
+            filtered_df = slice_since(activity_df, NOW - timedelta(days=30))
         elif period == "Last 3 Months":
-            filtered_df = activity_df[activity_df['timestamp'] >= now - timedelta(days=90)]
+            filtered_df = slice_since(activity_df, NOW - timedelta(days=90))
         else:
             filtered_df = activity_df
         
         if not filtered_df.empty:
             # Activity over time
-            daily_df = filtered_df.groupby(filtered_df['timestamp'].dt.date).agg({
+            day = filtered_df['date'].values
+            daily_df = filtered_df.groupby('date', sort=True).agg({
                 'duration': 'sum',
                 'calories': 'sum'
             }).reset_index()
-            daily_df.columns = ['date', 'duration', 'calories']
             
             fig = go.Figure()
             
@@ -355,10 +384,10 @@ with tab3:
             
             with col1:
                 # Activity type distribution
-                activity_counts = filtered_df['activity_type'].value_counts()
+                activity_counts = filtered_df.groupby('activity_type', observed=True).size().sort_values(ascending=False)
                 fig_pie = px.pie(
                     values=activity_counts.values,
-                    names=activity_counts.index,
+                    names=activity_counts.index.astype(str),
                     title='Activity Type Distribution',
                     hole=0.4
                 )
@@ -366,7 +395,7 @@ with tab3:
             
             with col2:
                 # Intensity distribution
-                intensity_df = filtered_df.groupby('intensity')['duration'].sum().reset_index()
+                intensity_df = filtered_df.groupby('intensity', observed=True)['duration'].sum().reset_index()
                 fig_bar = px.bar(
                     intensity_df,
                     x='intensity',
@@ -384,8 +413,11 @@ with tab3:
             # Weekly comparison
             st.markdown("### Weekly Comparison")
             
-            filtered_df['week'] = filtered_df['timestamp'].dt.to_period('W').astype(str)
-            weekly_df = filtered_df.groupby('week').agg({
+            # Monday-start week buckets straight from the day array (datetime64[W] is
+            # Thursday-anchored, so shift by 4 days either side of the cast)
+            thursday_offset = np.timedelta64(4, 'D')
+            week = (day - thursday_offset).astype('datetime64[W]').astype('datetime64[D]') + thursday_offset
+            weekly_df = filtered_df.assign(week=week).groupby('week', sort=True).agg({
                 'duration': 'sum',
                 'calories': 'sum',
                 'activity_type': 'count'
@@ -429,7 +461,7 @@ with tab3:
             st.download_button(
                 label="Download Activity Log (CSV)",
                 data=csv,
-                file_name=f"activities_{datetime.now().strftime('%Y%m%d')}.csv",
+                file_name=f"activities_{NOW.strftime('%Y%m%d')}.csv",
                 mime="text/csv"
             )
         else:
@@ -442,12 +474,13 @@ with tab4:
     st.subheader("Activity Insights & Recommendations")
     
     activity_df = get_user_activity_data(st.session_state.user_id)
+    summary = get_user_activity_summary(st.session_state.user_id, NOW)
     
-    if not activity_df.empty and len(activity_df) >= 3:
+    if summary and not activity_df.empty and len(activity_df) >= 3:
         insights = []
         
         # Weekly progress
-        weekly_stats = calculate_weekly_goal_progress(activity_df)
+        weekly_stats = calculate_weekly_goal_progress(summary)
         
         if weekly_stats['progress'] >= 100:
             insights.append({
@@ -477,8 +510,10 @@ with tab4:
             })
         
         # Favorite activity
-        favorite = activity_df['activity_type'].mode()[0]
-        favorite_count = (activity_df['activity_type'] == favorite).sum()
+        # One counting pass per column, reused for every insight below
+        activity_type_counts = activity_df['activity_type'].value_counts(sort=False)
+        favorite = activity_type_counts.idxmax()
+        favorite_count = int(activity_type_counts.max())
         favorite_pct = (favorite_count / len(activity_df)) * 100
         
         insights.append({
@@ -488,31 +523,26 @@ with tab4:
         })
         
         # Intensity analysis
-        intensity_counts = activity_df['intensity'].value_counts()
-        if 'Vigorous' in intensity_counts and intensity_counts['Vigorous'] > len(activity_df) * 0.3:
+        intensity_counts = activity_df['intensity'].value_counts(sort=False)
+        if intensity_counts.get('Vigorous', 0) > len(activity_df) * 0.3:
             insights.append({
                 'title': 'High Intensity Warrior!',
                 'message': "You love vigorous workouts! Great for cardiovascular fitness. Don't forget rest days for recovery.",
                 'type': 'info'
             })
-        elif 'Light' in intensity_counts and intensity_counts['Light'] > len(activity_df) * 0.7:
+        elif intensity_counts.get('Light', 0) > len(activity_df) * 0.7:
             insights.append({
                 'title': 'Consider Intensity Boost',
                 'message': "Most of your activities are light intensity. Try gradually increasing to moderate intensity for more heart health benefits!",
                 'type': 'info'
             })
         
-        # Recent streak calculation
+        # Recent streak calculation (consecutive days counted back from the latest activity)
         activity_df_sorted = activity_df.sort_values('timestamp', ascending=False)
-        activity_df_sorted['date'] = activity_df_sorted['timestamp'].dt.date
-        unique_dates = activity_df_sorted['date'].unique()
+        unique_dates = pd.unique(activity_df_sorted['date'].values)
         
-        streak = 1
-        for i in range(len(unique_dates) - 1):
-            if (unique_dates[i] - unique_dates[i+1]).days == 1:
-                streak += 1
-            else:
-                break
+        is_consec = (unique_dates[:-1] - unique_dates[1:]) == np.timedelta64(1, 'D')
+        streak = len(unique_dates) if is_consec.all() else int(np.argmin(is_consec)) + 1
         
         if streak >= 3:
             insights.append({
@@ -641,29 +671,3 @@ with tab4:
         
         Start logging to get personalized insights!
         """)
-
-# JavaScript to convert UTC timestamps to local time
-st.markdown("""
-<script>
-// Convert all UTC timestamps to local time
-document.addEventListener('DOMContentLoaded', function() {
-    const timestampElements = document.querySelectorAll('.timestamp-display');
-    timestampElements.forEach(element => {
-        const utcString = element.getAttribute('data-utc');
-        if (utcString) {
-            const utcDate = new Date(utcString);
-            const localDate = new Date(utcDate.getTime() - utcDate.getTimezoneOffset() * 60000);
-            element.textContent = localDate.toLocaleDateString('en-US', {
-                year: 'numeric',
-                month: 'short', 
-                day: 'numeric'
-            }) + ' at ' + localDate.toLocaleTimeString('en-US', {
-                hour: 'numeric',
-                minute: '2-digit',
-                hour12: true
-            });
-        }
-    });
-});
-</script>
-""", unsafe_allow_html=True)
\ No newline at end of file
@@ -1,8 +1,8 @@
 import streamlit as st
-import pandas as pd
 import re
-from datetime import datetime
-from utils.database import get_connection, save_blood_pressure, save_activity, save_cholesterol, save_chat_message, load_chat_history as db_load_chat_history, get_weekly_bp_summary
+from collections import deque
+from utils.csv_import import read_upload, parse_timestamps, parse_numbers, parse_text, valid_rows, to_records, skipped_message
+from utils.database import pooled_connection, bump_data_version, save_blood_pressure, bulk_insert_blood_pressure, save_activity, save_cholesterol, save_chat_messages, get_cached_chat_history, get_cached_weekly_bp_average, load_or_stop
 
 # --- Authentication Check ---
 if 'logged_in' not in st.session_state or not st.session_state.logged_in:
@@ -13,62 +13,101 @@ if 'logged_in' not in st.session_state or not st.session_state.logged_in:
 
 # --- Logic Processing Functions ---
 
-def process_blood_pressure(user_input, user_id):
-    bp_match = re.search(r'(\d{2,3})\s*(?:/|over)\s*(\d{2,3})', user_input.lower())
+# Patterns are compiled once at import and match case-insensitively, so input is never lowercased
+BP_PATTERN = re.compile(r'(\d{2,3})\s*(?:/|over)\s*(\d{2,3})', re.I)
+DURATION_PATTERN = re.compile(r'(\d+)\s*(min|minute)', re.I)
+NUMBER_PATTERN = re.compile(r'\d+')
+LDL_PATTERN = re.compile(r'ldl', re.I)
+
+# Simple calorie estimation: assume moderate intensity exercise, 70kg person
+# Calories = (MET * weight * hours) = (6.0 * 70 / 60) per minute
+KCAL_PER_MINUTE = 6.0 * 70 / 60
+
+def process_blood_pressure(user_input, user_id, conn=None):
+    bp_match = BP_PATTERN.search(user_input)
     if bp_match:
         sys, dia = int(bp_match.group(1)), int(bp_match.group(2))
-        if save_blood_pressure(user_id, sys, dia):
+        if save_blood_pressure(user_id, sys, dia, conn=conn):
             return f"Logged BP: **{sys}/{dia} mmHg**. Great job tracking your levels!"
     return "Could not parse BP. Try: 'My BP is 120/80'"
 
-def process_activity(user_input, user_id):
-    duration_match = re.search(r'(\d+)\s*(min|minute)', user_input.lower())
+def process_activity(user_input, user_id, conn=None):
+    duration_match = DURATION_PATTERN.search(user_input)
     duration = int(duration_match.group(1)) if duration_match else 30
     
-    # Simple calorie estimation: assume moderate intensity exercise, 70kg person
-    # Calories = (MET * weight * hours) = (6.0 * 70 * duration/60)
-    calories = round((6.0 * 70 * duration) / 60, 1)
+    calories = round(duration * KCAL_PER_MINUTE, 1)
     
-    if save_activity(user_id, "Exercise", duration, "Moderate", calories):
+    if save_activity(user_id, "Exercise", duration, "Moderate", calories, conn=conn):
         return f"Logged **{duration} mins** of activity! Keep moving!"
     return "Error logging activity."
 
-def process_cholesterol(user_input, user_id):
-    numbers = re.findall(r'\d+', user_input)
-    if numbers:
-        val = int(numbers[0])
-        if 'ldl' in user_input.lower():
-            save_cholesterol(user_id, None, ldl=val)
-            return f"Logged LDL Cholesterol: **{val} mg/dL**."
-        else:
-            save_cholesterol(user_id, total_chol=val)
+def process_cholesterol(user_input, user_id, conn=None):
+    number_match = NUMBER_PATTERN.search(user_input)
+    if number_match:
+        val = int(number_match.group())
+        if LDL_PATTERN.search(user_input):
+            if save_cholesterol(user_id, None, ldl=val, conn=conn):
+                return f"Logged LDL Cholesterol: **{val} mg/dL**."
+        elif save_cholesterol(user_id, total_chol=val, conn=conn):
             return f"Logged Total Cholesterol: **{val} mg/dL**."
+        return "Error logging cholesterol."
     return "Please provide a number for your cholesterol."
 
 def process_status_check(user_id):
     try:
-        df = get_weekly_bp_summary(user_id)
-        if not df.empty and not df['avg_systolic'].isna().all():
-            return f"**Weekly Summary:** Your average BP is **{df['avg_systolic'].iloc[0]:.0f}/{df['avg_diastolic'].iloc[0]:.0f} mmHg**."
+        weekly_avg = get_cached_weekly_bp_average(user_id)
+        if weekly_avg:
+            avg_sys, avg_dia = weekly_avg
+            return f"**Weekly Summary:** Your average BP is **{avg_sys:.0f}/{avg_dia:.0f} mmHg**."
         return "No data found for the last 7 days. Start logging to see your summary!"
     except Exception as e: 
         return f"Error fetching status: {e}"
 
-def process_user_input(user_input, user_id):
-    inp = user_input.lower()
-    if 'bp' in inp or '/' in inp or 'pressure' in inp: 
-        return process_blood_pressure(user_input, user_id)
-    if any(word in inp for word in ['walk', 'run', 'swim', 'min', 'exercise', 'activity']): 
-        return process_activity(user_input, user_id)
-    if any(word in inp for word in ['cholesterol', 'ldl', 'hdl']):
-        return process_cholesterol(user_input, user_id)
-    if any(word in inp for word in ['status', 'how', 'summary', 'doing', 'report']): 
-        return process_status_check(user_id)
+# Intent routes in priority order; each keyword set is one compiled alternation,
+# checked in order so e.g. "how is my cholesterol" still routes to cholesterol
+INTENT_ROUTES = (
+    (re.compile(r'bp|/|pressure', re.I), process_blood_pressure),
+    (re.compile(r'walk|run|swim|min|exercise|activity', re.I), process_activity),
+    (re.compile(r'cholesterol|ldl|hdl', re.I), process_cholesterol),
+    (re.compile(r'status|how|summary|doing|report', re.I), lambda inp, user_id, conn: process_status_check(user_id))
+)
+
+def process_user_input(user_input, user_id, conn=None):
+    for pattern, handler in INTENT_ROUTES:
+        if pattern.search(user_input):
+            return handler(user_input, user_id, conn)
     
     return "I can log your BP (120/80), activities (walked 20 min), or cholesterol. How can I help?"
 
-def load_chat_history(user_id):
-    return db_load_chat_history(user_id)
+# Only the most recent messages are kept in session and re-rendered each rerun
+CHAT_HISTORY_LIMIT = 50
+
+def load_chat_history(user_id, limit=CHAT_HISTORY_LIMIT):
+    return deque(load_or_stop(get_cached_chat_history, user_id, limit), maxlen=limit)
+
+# Tables a chat turn can write to that have cached reads
+CHAT_TURN_TABLES = ("blood_pressure", "activities", "chat_history")
+
+def log_chat_turn(user_input, user_id):
+    """Route one message and store both chat lines in a single transaction.
+    Returns the assistant's reply, or None if the turn was rolled back and nothing was saved."""
+    with pooled_connection() as conn:
+        if not conn:
+            return None
+        response = process_user_input(user_input, user_id, conn)
+        # A failed routed insert aborts the transaction, so this INSERT fails with it
+        saved = save_chat_messages(user_id, [("user", user_input), ("assistant", response)], conn=conn)
+        if saved:
+            try:
+                conn.commit()
+            except Exception:
+                saved = False
+        if not saved:
+            conn.rollback()
+            return None
+    # Invalidate only once the rows are visible, so a concurrent rerun can't re-cache the old state
+    bump_data_version(user_id, *CHAT_TURN_TABLES)
+    return response
 
 # --- UI Helper ---
 
@@ -83,17 +122,68 @@ def display_guide():
         4. **Get Summary:** *'How am I doing?'* or *'Weekly summary'*
         """)
 
+BP_IMPORT_COLUMNS = ["timestamp", "systolic", "diastolic", "heart_rate", "notes"]
+
+def parse_bp_csv(uploaded_file):
+    """(rows for bulk_insert_blood_pressure, skipped CSV line numbers) from a CSV with
+    timestamp,systolic,diastolic[,heart_rate,notes]"""
+    raw = read_upload(uploaded_file, ("timestamp", "systolic", "diastolic"), ("heart_rate", "notes"))
+    # Same bounds as the BP page's Log Reading form
+    readings = raw.assign(
+        timestamp=parse_timestamps(raw["timestamp"]),
+        systolic=parse_numbers(raw["systolic"], 80, 250, integer=True),
+        diastolic=parse_numbers(raw["diastolic"], 40, 150, integer=True),
+        heart_rate=parse_numbers(raw["heart_rate"], 40, 200, integer=True),
+        notes=parse_text(raw["notes"])
+    )
+    readings, skipped = valid_rows(raw, readings, ("timestamp", "systolic", "diastolic"), optional=("heart_rate",))
+    return to_records(readings, BP_IMPORT_COLUMNS), skipped
+
+def display_bp_import(user_id):
+    with st.expander("Import blood pressure history (CSV)"):
+        st.caption("Columns: timestamp, systolic, diastolic, and optionally heart_rate, notes")
+        uploaded_file = st.file_uploader("BP history CSV", type="csv", label_visibility="collapsed")
+        if uploaded_file and st.button("Import Readings"):
+            try:
+                rows, skipped = parse_bp_csv(uploaded_file)
+            except ValueError as e:
+                st.error(f"Could not read CSV: {e}")
+                return
+            if skipped:
+                st.warning(skipped_message(skipped))
+            if not rows:
+                st.error("No valid readings to import.")
+                return
+            count = bulk_insert_blood_pressure(user_id, rows)
+            if count is False:
+                st.error("Import failed. Please check the file and try again.")
+            else:
+                st.success(f"Imported {count} readings.")
+
 # --- Main Page Render ---
 
 def render():
     st.title("Smart Health Assistant")
     
     display_guide()
+    display_bp_import(st.session_state.user_id)
     
     if 'chat_history' not in st.session_state:
+        st.session_state.chat_history_limit = CHAT_HISTORY_LIMIT
         st.session_state.chat_history = load_chat_history(st.session_state.user_id)
         if not st.session_state.chat_history:
-            st.session_state.chat_history = [{"role": "assistant", "content": "Hi! I'm your Heart Assistant. How can I help you track your health today?"}]
+            st.session_state.chat_history.append({"role": "assistant", "content": "Hi! I'm your Heart Assistant. How can I help you track your health today?"})
+
+    chat_fragment(st.session_state.user_id)
+
+@st.fragment
+def chat_fragment(user_id):
+    """Transcript and input; a chat turn reruns only this fragment, not the whole page"""
+    # Older turns stay in the database until explicitly requested
+    if len(st.session_state.chat_history) >= st.session_state.chat_history_limit:
+        if st.button("Load earlier messages"):
+            st.session_state.chat_history_limit += CHAT_HISTORY_LIMIT
+            st.session_state.chat_history = load_chat_history(user_id, st.session_state.chat_history_limit)
 
     for msg in st.session_state.chat_history:
         try:
@@ -105,19 +195,22 @@ def render():
     user_input = st.chat_input("Enter your health data...")
     if user_input:
         st.session_state.chat_history.append({"role": "user", "content": user_input})
-        save_chat_message(st.session_state.user_id, "user", user_input)
         
         with st.chat_message("user"):
             st.markdown(user_input)
             
-        response = process_user_input(user_input, st.session_state.user_id)
+        # One transaction per turn: any logged reading and both chat messages commit together
+        response = log_chat_turn(user_input, user_id)
+        if response is None:
+            st.session_state.chat_history.pop()
+            st.error("That message couldn't be saved, so nothing was logged. Please try again.")
+            return
         
         with st.chat_message("assistant"):
             st.markdown(response)
             
+        # Both messages are already on screen, so no st.rerun() is needed
         st.session_state.chat_history.append({"role": "assistant", "content": response})
-        save_chat_message(st.session_state.user_id, "assistant", response)
-        st.rerun()
 
 if __name__ == "__main__":
     render()
\ No newline at end of file
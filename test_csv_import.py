@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import io
+import sys
+sys.path.append('.')
+
+import pandas as pd
+from utils.csv_import import read_upload, parse_timestamps, parse_numbers, valid_rows, to_records, skipped_message
+
+BP_CSV = b"""timestamp,systolic,diastolic,heart_rate
+2024-01-05T08:30:00,120,80,70
+2024-01-05T09:00:00+02:00,130,85,
+,125,82,72
+2024-01-06T08:00:00,400,80,70
+2024-01-06T09:00:00,120,80,abc
+2024-01-06T10:00:00,118,78,65
+"""
+BP_COLUMNS = ["timestamp", "systolic", "diastolic", "heart_rate"]
+
+def parse_bp(raw):
+    return pd.DataFrame({
+        'timestamp': parse_timestamps(raw['timestamp']),
+        'systolic': parse_numbers(raw['systolic'], 80, 250, integer=True),
+        'diastolic': parse_numbers(raw['diastolic'], 40, 150, integer=True),
+        'heart_rate': parse_numbers(raw['heart_rate'], 40, 200, integer=True),
+    })
+
+def test_parse_timestamps():
+    values = pd.Series(["2024-01-05T08:30:00", "2024-01-05T08:30:00+02:00", "", "not a date", None])
+    result = parse_timestamps(values)
+    assert result.dt.tz is None
+    # Offsets are converted to UTC, values without one are kept as they are
+    assert result[0] == pd.Timestamp("2024-01-05 08:30:00")
+    assert result[1] == pd.Timestamp("2024-01-05 06:30:00")
+    assert result[2:].isna().all()
+
+def test_parse_numbers():
+    values = pd.Series(["120", "", "abc", "300", "79", "80", "250"])
+    result = parse_numbers(values, 80, 250)
+    assert result.isna().tolist() == [False, True, True, True, True, False, False]
+    assert result[0] == 120 and result[5] == 80 and result[6] == 250
+
+def test_parse_numbers_integer():
+    result = parse_numbers(pd.Series(["72", "72.5", ""]), 40, 200, integer=True)
+    assert str(result.dtype) == "Int64"
+    assert result[0] == 72
+    assert result[1:].isna().all()
+
+def test_read_upload_missing_column():
+    upload = io.BytesIO(b"timestamp,systolic\n2024-01-05T08:30:00,120\n")
+    try:
+        read_upload(upload, ["timestamp", "systolic", "diastolic"])
+    except ValueError as e:
+        assert "diastolic" in str(e)
+    else:
+        raise AssertionError("missing column was not reported")
+
+def test_read_upload_adds_optional_column():
+    upload = io.BytesIO(b"timestamp,systolic,diastolic\n2024-01-05T08:30:00,120,80\n")
+    raw = read_upload(upload, ["timestamp", "systolic", "diastolic"], ["heart_rate"])
+    assert raw['heart_rate'].isna().all()
+
+def test_valid_rows():
+    raw = read_upload(io.BytesIO(BP_CSV), BP_COLUMNS[:3], BP_COLUMNS[3:])
+    rows, skipped = valid_rows(raw, parse_bp(raw), BP_COLUMNS[:3], BP_COLUMNS[3:])
+    # Line 3's blank heart rate is optional; 4 has no timestamp, 5 is out of range, 6 has an invalid heart rate
+    assert skipped == [4, 5, 6]
+    assert len(rows) == 3
+
+def test_to_records():
+    raw = read_upload(io.BytesIO(BP_CSV), BP_COLUMNS[:3], BP_COLUMNS[3:])
+    rows, _ = valid_rows(raw, parse_bp(raw), BP_COLUMNS[:3], BP_COLUMNS[3:])
+    records = to_records(rows, BP_COLUMNS)
+    assert records[0] == (pd.Timestamp("2024-01-05 08:30:00"), 120, 80, 70)
+    assert records[1] == (pd.Timestamp("2024-01-05 07:00:00"), 130, 85, None)
+    assert records[2] == (pd.Timestamp("2024-01-06 10:00:00"), 118, 78, 65)
+
+def test_skipped_message():
+    assert skipped_message([4, 5]) == "Skipped 2 incomplete or invalid row(s) (line 4, 5)."
+    message = skipped_message(list(range(2, 15)))
+    assert message.startswith("Skipped 13 ")
+    assert "11, ...)" in message and "12" not in message
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name} OK")
+    print("All CSV import checks passed!")
@@ -3,7 +3,7 @@ import sys
 sys.path.append('.')
 
 try:
-    from utils.database import init_db, get_connection
+    from utils.database import init_db, get_connection, release_connection
     print("Database imports OK")
     
     init_db()
@@ -11,8 +11,8 @@ try:
     
     conn = get_connection()
     print(f"Connection type: {type(conn)}")
-    conn.close()
-    print("Connection closed")
+    release_connection(conn)
+    print("Connection released")
     
     print("All database functions working!")
     
@@ -1,21 +1,19 @@
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, cross_val_score
-from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.linear_model import LogisticRegression
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.metrics import (
-    accuracy_score, precision_score, recall_score, 
-    f1_score, roc_auc_score, confusion_matrix, 
-    classification_report
-)
 import joblib
 import os
 from datetime import datetime
 import warnings 
 warnings.filterwarnings('ignore')
 
+# Column dtypes for heartDiseaseCleaned.csv: coded categoricals fit in int8, measurements in float32
+CSV_DTYPES = {
+    'age': 'float32', 'sex': 'int8', 'chest_pain_type': 'int8', 'resting_bp_s': 'float32',
+    'cholesterol': 'float32', 'fasting_blood_sugar': 'int8', 'resting_ecg': 'int8',
+    'max_heart_rate': 'float32', 'exercise_angina': 'int8', 'oldpeak': 'float32',
+    'ST_slope': 'int8', 'target': 'int8'
+}
+
 def load_data(filepath='heartDiseaseCleaned.csv'):
     """Load the heart disease dataset"""
     print("=" * 60)
@@ -27,7 +25,7 @@ def load_data(filepath='heartDiseaseCleaned.csv'):
         print("Please ensure 'heartDiseaseCleaned.csv' is in the project root")
         return None
     
-    df = pd.read_csv(filepath)
+    df = pd.read_csv(filepath, dtype=CSV_DTYPES)
     print(f"Dataset loaded successfully!")
     print(f"Shape: {df.shape[0]} rows, {df.shape[1]} columns")
     print(f"\nColumns: {list(df.columns)}")
@@ -39,6 +37,10 @@ def load_data(filepath='heartDiseaseCleaned.csv'):
 
 def prepare_data(df):
     """Prepare data for training"""
+    # sklearn is imported where it is used so importing this module (e.g. for load_data) stays cheap
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+
     print("=" * 60)
     print("STEP 2: PREPARING DATA")
     print("=" * 60)
@@ -51,9 +53,8 @@ def prepare_data(df):
     print(f"Target: {y.name if hasattr(y, 'name') else 'target'}")
 
     # Check for missing values
-    missing = X.isnull().sum().sum()
-    if missing > 0:
-        print(f"Warning: {missing} missing values found. Filling with median...")
+    if X.isna().any().any():
+        print(f"Warning: {X.isna().sum().sum()} missing values found. Filling with median...")
         X = X.fillna(X.median())
     else:
         print("No missing values")
@@ -65,8 +66,9 @@ def prepare_data(df):
     print(f'Test set: {X_test.shape[0]} samples')
 
     scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
+    # float32 halves the bandwidth of KNN distances and RF split scans (trees use float32 internally anyway)
+    X_train_scaled = np.ascontiguousarray(scaler.fit_transform(X_train), dtype=np.float32)
+    X_test_scaled = np.ascontiguousarray(scaler.transform(X_test), dtype=np.float32)
 
     print('Features scaled using StandardScaler')
     print()
@@ -74,39 +76,45 @@ def prepare_data(df):
     return X_train_scaled, X_test_scaled, y_train, y_test, scaler, X.columns.tolist()
 
 def train_models(X_train, y_train):
-    """Train multiple models and compare"""
+    """Compare models by cross-validated AUC; returns (fitted best model, its name, CV scores per model)"""
+    from sklearn.model_selection import cross_validate, StratifiedKFold
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.neighbors import KNeighborsClassifier
+
     print("=" * 60)
     print("STEP 3: TRAINING MODELS")
     print("=" * 60)
     
     models = {
         'Logistic Regression': LogisticRegression(random_state=42, max_iter=1000),
-        'Random Forest': RandomForestClassifier(n_estimators=100, random_state=42),
-        'KNN': KNeighborsClassifier(n_neighbors=7)
+        'Random Forest': RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1),
+        'KNN': KNeighborsClassifier(n_neighbors=7, n_jobs=-1)
     }
     
-    trained_models = {}
     cv_scores = {}
+    # Fixed, shuffled folds so every model is compared on the same splits
+    cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
 
     for name, model in models.items():
         print(f'\nTraining {name}...')
 
         try:
-            model.fit(X_train, y_train)
-            
-            cv_score = cross_val_score(model, X_train, y_train, cv=5, scoring='roc_auc')
+            # Score on CV folds only (run in parallel); the full-data fit is done once, for the winner
+            cv_result = cross_validate(model, X_train, y_train, cv=cv, scoring='roc_auc', n_jobs=-1)
+            cv_score = cv_result['test_score']
             cv_scores[name] = cv_score
 
-            trained_models[name] = model
-
-            print(f'   {name} trained')
+            print(f'   {name} cross-validated')
             print(f'   CV AUC Score: {cv_score.mean():.4f} (+/- {cv_score.std():.4f})')
         except Exception as e:
             print(f'   {name} failed: {str(e)}')
             continue
 
     best_model_name = max(cv_scores, key=lambda k: cv_scores[k].mean())
-    best_model = trained_models[best_model_name]
+    best_model = models[best_model_name]
+    best_model.fit(X_train, y_train)
+    print(f'\n{best_model_name} refit on the full training set')
 
     print(f'\n{"="*60}')
     print('MODEL COMPARISON (Top 3)')
@@ -122,10 +130,17 @@ def train_models(X_train, y_train):
     print(f'   AUC Score: {cv_scores[best_model_name].mean():.4f}')
     print()
     
-    return best_model, best_model_name, trained_models, cv_scores
+    # Only the winner is fitted; the other estimators were scored by CV alone
+    return best_model, best_model_name, cv_scores
 
 def evaluate_model(model, X_test, y_test, model_name):
     """Evaluate model performance"""
+    from sklearn.metrics import (
+        accuracy_score, precision_score, recall_score, 
+        f1_score, roc_auc_score, confusion_matrix, 
+        classification_report
+    )
+
     print('=' * 60) 
     print(f'STEP 4: EVALUATING {model_name}')
     print('=' * 60)
@@ -165,6 +180,16 @@ def evaluate_model(model, X_test, y_test, model_name):
         'confusion_matrix': cm
     }
 
+def cast_model_to_float32(model):
+    """Downcast fitted weight arrays to float32 where the estimator allows it"""
+    # Tree ensembles keep their node arrays in read-only Cython structures, so only
+    # plain ndarray attributes (linear coefficients, KNN training points) are cast
+    for attr in ('coef_', 'intercept_', '_fit_X'):
+        value = getattr(model, attr, None)
+        if isinstance(value, np.ndarray) and value.dtype == np.float64:
+            setattr(model, attr, np.ascontiguousarray(value, dtype=np.float32))
+    return model
+
 def save_model(model, scaler, feature_names, model_name, metrics):
     """Save trained model and artifacts"""
     print('=' * 60)
@@ -174,7 +199,8 @@ def save_model(model, scaler, feature_names, model_name, metrics):
     os.makedirs('models', exist_ok=True)
     
     model_path = 'models/heart_disease_model.pkl'
-    joblib.dump(model, model_path)
+    # Uncompressed so the app can load it with mmap_mode='r'
+    joblib.dump(cast_model_to_float32(model), model_path, compress=0)
     print(f"Model saved: {model_path}")
     
     scaler_path = 'models/scaler.pkl'
@@ -231,7 +257,7 @@ def main():
         return
     
     X_train, X_test, y_train, y_test, scaler, feature_names = prepare_data(df)
-    best_model, best_model_name, all_models, cv_scores = train_models(X_train, y_train)
+    best_model, best_model_name, cv_scores = train_models(X_train, y_train)
     metrics = evaluate_model(best_model, X_test, y_test, best_model_name)
     display_feature_importance(best_model, feature_names)
     save_model(best_model, scaler, feature_names, best_model_name, metrics)
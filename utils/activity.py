@@ -0,0 +1,37 @@
+# Activity reference data. Lives outside the page script so it is built once at
+# import instead of on every Streamlit rerun.
+
+# MET (Metabolic Equivalent) values for different activities
+MET_VALUES = {
+    "Walking (Casual)": 3.5,
+    "Walking (Brisk)": 4.5,
+    "Running (Light)": 8.0,
+    "Running (Fast)": 11.0,
+    "Cycling (Casual)": 6.0,
+    "Cycling (Vigorous)": 10.0,
+    "Swimming": 7.0,
+    "Yoga": 2.5,
+    "Gym (Weight Training)": 5.0,
+    "Gym (Cardio)": 7.0,
+    "Dancing": 5.5,
+    "Hiking": 6.5,
+    "Basketball": 8.0,
+    "Football/Soccer": 10.0,
+    "Tennis": 7.0,
+    "Golf": 4.3,
+    "Gardening": 4.0,
+    "Cleaning": 3.5,
+    "Stairs": 8.0,
+    "Jump Rope": 12.0,
+    "Other": 5.0
+}
+
+# Intensity indicators without emojis
+INTENSITY_INDICATORS = {
+    "Light": "[L]",
+    "Moderate": "[M]",
+    "Vigorous": "[V]"
+}
+
+# Selectbox options, built once rather than on every rerun
+MET_KEYS = tuple(MET_VALUES)
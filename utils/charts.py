@@ -0,0 +1,45 @@
+import numpy as np
+
+# Traces with more points than this are downsampled before being sent to the browser
+MAX_CHART_POINTS = 2000
+
+def lttb_downsample(x, y, n_out=MAX_CHART_POINTS):
+    """Largest-Triangle-Three-Buckets downsampling; returns (x, y) with at most n_out points"""
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    # Work on a numeric copy of x so date/datetime axes are supported
+    if x.dtype.kind in 'fiu':
+        xn = x.astype(float)
+    else:
+        xn = x.astype('datetime64[ns]').astype(np.int64).astype(float)
+
+    # First and last points are always kept; the rest are split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point for the final bucket)
+        if i + 2 < len(edges):
+            nxt_start, nxt_end = edges[i + 1], edges[i + 2]
+        else:
+            nxt_start, nxt_end = n - 1, n
+        avg_x = xn[nxt_start:nxt_end].mean()
+        avg_y = y[nxt_start:nxt_end].mean()
+
+        # Pick the point in this bucket forming the largest triangle with a and the next average
+        area = np.abs(
+            (xn[a] - avg_x) * (y[start:end] - y[a])
+            - (xn[a] - xn[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+
+    return x[keep], y[keep]
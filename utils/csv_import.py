@@ -0,0 +1,63 @@
+# Shared parsing for the CSV history importers. Each importer parses its columns with the
+# helpers here, drops the rows that didn't validate, and hands COPY-ready tuples to copy_rows.
+import io
+import pandas as pd
+
+# Skipped line numbers listed in the import warning before it is truncated
+MAX_REPORTED_LINES = 10
+
+def read_upload(uploaded_file, required, optional=()):
+    """Uploaded CSV as a string-typed frame with every optional column present; raises ValueError on missing columns"""
+    df = pd.read_csv(io.BytesIO(uploaded_file.getvalue()), dtype=str, skipinitialspace=True)
+    df.columns = df.columns.str.strip()
+    missing = [col for col in required if col not in df.columns]
+    if missing:
+        raise ValueError(f"missing column(s): {', '.join(missing)}")
+    for col in optional:
+        if col not in df.columns:
+            df[col] = None
+    return df
+
+def parse_timestamps(values):
+    """ISO 8601 strings as naive UTC datetimes, matching the TIMESTAMP columns; NaT where blank or invalid"""
+    # Offsets are converted to UTC rather than dropped; values without one are taken as UTC already
+    return pd.to_datetime(values, format='ISO8601', utc=True, errors='coerce').dt.tz_localize(None)
+
+def parse_numbers(values, low, high, integer=False):
+    """Numbers within [low, high] (whole numbers only with integer=True); NA where blank, invalid or out of range"""
+    numbers = pd.to_numeric(values, errors='coerce')
+    ok = numbers.between(low, high)
+    if integer:
+        return numbers.where(ok & (numbers % 1 == 0)).astype('Int64')
+    return numbers.where(ok)
+
+def parse_choice(values, allowed):
+    """Stripped labels that are in `allowed`; None otherwise"""
+    labels = values.str.strip()
+    return labels.where(labels.isin(list(allowed)), None)
+
+def parse_text(values):
+    """Stripped free text; None where blank"""
+    text = values.str.strip()
+    return text.where(text.notna() & (text != ''), None)
+
+def valid_rows(raw, parsed, required, optional=()):
+    """Rows of `parsed` where every required column parsed and every optional one is blank or parsed,
+    plus the 1-based CSV line numbers of the rows that were dropped"""
+    ok = parsed[list(required)].notna().all(axis=1)
+    for col in optional:
+        ok &= raw[col].isna() | parsed[col].notna()
+    # +2: one for the header line, one for 1-based numbering
+    return parsed[ok], (raw.index[~ok] + 2).tolist()
+
+def to_records(df, columns):
+    """Rows as tuples in `columns` order with missing values as None, ready for copy_rows"""
+    values = df[columns].astype(object)
+    return list(values.where(values.notna(), None).itertuples(index=False, name=None))
+
+def skipped_message(skipped):
+    """Warning text listing the skipped CSV lines"""
+    lines = ", ".join(str(line) for line in skipped[:MAX_REPORTED_LINES])
+    if len(skipped) > MAX_REPORTED_LINES:
+        lines += ", ..."
+    return f"Skipped {len(skipped)} incomplete or invalid row(s) (line {lines})."
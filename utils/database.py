@@ -1,347 +1,860 @@
+import pandas as pd
 import psycopg2
+import psycopg2.pool
+import psycopg2.extras
+import psycopg2.extensions
 import streamlit as st
 import hashlib
-import os
+import hmac
+import bcrypt
+import time
+import functools
+import itertools
+import uuid
+import io
+import logging
+import csv
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+# HELPER: Connection pool shared by every session in this server process
+# Connections idle in the pool longer than this are pinged before reuse (the server may have dropped them)
+POOL_IDLE_TIMEOUT = 300
+# Open connections shared by all sessions; a request beyond this waits for one to be released
+POOL_MAX_CONNECTIONS = 10
+# Seconds to wait for a free connection before giving up, and how often to retry meanwhile
+POOL_WAIT_TIMEOUT = 5
+POOL_RETRY_INTERVAL = 0.05
+_last_released = {}
+
+@st.cache_resource(show_spinner=False)
+def get_pool():
+    return psycopg2.pool.ThreadedConnectionPool(1, POOL_MAX_CONNECTIONS, st.secrets["db_url"])
+
+def checkout(pool):
+    """pool.getconn(), waiting up to POOL_WAIT_TIMEOUT for a connection when all are in use"""
+    # ThreadedConnectionPool raises PoolError instead of blocking when it is exhausted
+    deadline = time.monotonic() + POOL_WAIT_TIMEOUT
+    while True:
+        try:
+            return pool.getconn()
+        except psycopg2.pool.PoolError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(POOL_RETRY_INTERVAL)
+
+def is_stale(conn):
+    """True if conn is closed, or was idle past POOL_IDLE_TIMEOUT and fails a SELECT 1"""
+    if conn.closed:
+        return True
+    if time.monotonic() - _last_released.get(id(conn), time.monotonic()) < POOL_IDLE_TIMEOUT:
+        return False
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.close()
+        conn.rollback()
+        return False
+    except Exception:
+        return True
 
-# HELPER: Connection
 def get_connection():
     try:
-        return psycopg2.connect(st.secrets["db_url"])
+        pool = get_pool()
+        conn = checkout(pool)
+        if is_stale(conn):
+            # Dropped by the server while idle in the pool; swap it for a fresh one
+            _last_released.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+            conn = checkout(pool)
+        return conn
     except Exception as e:
         st.error(f"Database Connection Error: {e}")
         return None
 
+def release_connection(conn):
+    """Hand a connection back to the pool instead of closing it"""
+    try:
+        if not conn.closed and conn.status != psycopg2.extensions.STATUS_READY:
+            # Don't pass an open or aborted transaction on to the next borrower
+            conn.rollback()
+        if conn.closed:
+            _last_released.pop(id(conn), None)
+        else:
+            _last_released[id(conn)] = time.monotonic()
+        get_pool().putconn(conn, close=bool(conn.closed))
+    except Exception as e:
+        log.error("Error releasing connection: %s", e)
+
+@contextmanager
+def pooled_connection():
+    """Borrow a pooled connection for the duration of a with-block"""
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        if conn:
+            release_connection(conn)
+
+@contextmanager
+def write_connection(conn=None):
+    """Join the caller's open transaction when given a connection, else borrow a pooled one"""
+    if conn is not None:
+        yield conn
+    else:
+        with pooled_connection() as pooled:
+            yield pooled
+
 # ALIAS for old pages
 connect_db = get_connection
 
 def hash_password(password):
+    """Salted, adaptive bcrypt hash (cost 12) stored as text"""
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=12)).decode()
+
+def legacy_hash_password(password):
+    """Unsalted SHA-256 hex digest used by accounts created before bcrypt"""
     return hashlib.sha256(str.encode(password)).hexdigest()
 
+# Checked against when the username doesn't exist, so that path costs the same as a wrong password
+DUMMY_PASSWORD_HASH = bcrypt.hashpw(b"dummy-password", bcrypt.gensalt(rounds=12)).decode()
+
+def check_password(password, stored_hash):
+    """Constant-time check of password against a bcrypt hash, or a legacy SHA-256 hex digest"""
+    if stored_hash.startswith("$2"):
+        return bcrypt.checkpw(password.encode(), stored_hash.encode())
+    # Pay for a bcrypt check here too, so a legacy account answers as slowly as any other and
+    # response time doesn't reveal which usernames exist
+    bcrypt.checkpw(password.encode(), DUMMY_PASSWORD_HASH.encode())
+    return hmac.compare_digest(legacy_hash_password(password), stored_hash)
+
+# Schema and per-user (user_id, timestamp) indexes, sent to the server as a single statement batch
+INIT_DDL = """
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS blood_pressure (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        systolic INTEGER NOT NULL,
+        diastolic INTEGER NOT NULL,
+        heart_rate INTEGER,
+        notes TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS activities (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        activity_type TEXT NOT NULL,
+        duration REAL NOT NULL,
+        intensity TEXT NOT NULL,
+        calories REAL NOT NULL,
+        notes TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS predictions_history (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        age INTEGER,
+        cholesterol INTEGER,
+        resting_bp_s INTEGER,
+        predicted_target INTEGER,
+        probability REAL,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS chat_history (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        role TEXT NOT NULL,
+        message TEXT NOT NULL,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS cholesterol_readings (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        total_cholesterol INTEGER,
+        ldl INTEGER,
+        hdl INTEGER,
+        triglycerides INTEGER,
+        notes TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS bp_user_ts ON blood_pressure (user_id, timestamp DESC);
+    CREATE INDEX IF NOT EXISTS activities_user_ts ON activities (user_id, timestamp DESC);
+    CREATE INDEX IF NOT EXISTS predictions_user_ts ON predictions_history (user_id, timestamp DESC);
+    CREATE INDEX IF NOT EXISTS chat_user_ts ON chat_history (user_id, timestamp DESC, id DESC);
+    CREATE INDEX IF NOT EXISTS cholesterol_user_ts ON cholesterol_readings (user_id, timestamp DESC);
+"""
+
+# One-off migration for databases created when user_id was a stringified TEXT column
+MIGRATE_USER_ID_DDL = """
+DO $$
+DECLARE t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['blood_pressure', 'activities', 'predictions_history', 'chat_history', 'cholesterol_readings'] LOOP
+        IF EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = t
+              AND column_name = 'user_id' AND data_type = 'text'
+        ) THEN
+            EXECUTE format('ALTER TABLE %I ALTER COLUMN user_id TYPE INTEGER USING user_id::integer', t);
+        END IF;
+        -- Same name CREATE TABLE gives the inline REFERENCES, so fresh and migrated tables match
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_constraint
+            WHERE conrelid = format('%I', t)::regclass AND conname = format('%s_user_id_fkey', t)
+        ) THEN
+            EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE',
+                           t, format('%s_user_id_fkey', t));
+        END IF;
+    END LOOP;
+END $$;
+"""
+
 def init_db():
-    conn = get_connection()
-    if conn:
-        try:
-            cur = conn.cursor()
-            # USE 'SERIAL' for PostgreSQL
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id SERIAL PRIMARY KEY,
-                    username TEXT UNIQUE NOT NULL,
-                    password TEXT NOT NULL
-                )
-            """)
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS blood_pressure (
-                    id SERIAL PRIMARY KEY,
-                    user_id TEXT NOT NULL,
-                    systolic INTEGER NOT NULL,
-                    diastolic INTEGER NOT NULL,
-                    heart_rate INTEGER,
-                    notes TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS activities (
-                    id SERIAL PRIMARY KEY,
-                    user_id TEXT NOT NULL,
-                    activity_type TEXT NOT NULL,
-                    duration REAL NOT NULL,
-                    intensity TEXT NOT NULL,
-                    calories REAL NOT NULL,
-                    notes TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS predictions_history (
-                    id SERIAL PRIMARY KEY,
-                    user_id TEXT NOT NULL,
-                    age INTEGER,
-                    cholesterol INTEGER,
-                    resting_bp_s INTEGER,
-                    predicted_target INTEGER,
-                    probability REAL,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS chat_history (
-                    id SERIAL PRIMARY KEY,
-                    user_id TEXT NOT NULL,
-                    role TEXT NOT NULL,
-                    message TEXT NOT NULL,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS cholesterol_readings (
-                    id SERIAL PRIMARY KEY,
-                    user_id TEXT NOT NULL,
-                    total_cholesterol INTEGER,
-                    ldl INTEGER,
-                    hdl INTEGER,
-                    triglycerides INTEGER,
-                    notes TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            conn.commit()
-            cur.close()
-            conn.close()
-            print("Database tables initialized successfully")
-        except Exception as e:
-            print(f"Error creating tables: {e}")
-            st.error(f"Error creating tables: {e}")
+    """Create the schema and run the user_id migration; returns True on success, False on failure"""
+    with pooled_connection() as conn:
+        if conn:
+            try:
+                cur = conn.cursor()
+                # USE 'SERIAL' for PostgreSQL; one execute = one round-trip for all tables and indexes
+                cur.execute(INIT_DDL)
+                conn.commit()
+                # Fails on orphaned or non-numeric legacy ids; those rows need cleaning up before startup succeeds
+                cur.execute(MIGRATE_USER_ID_DDL)
+                conn.commit()
+                cur.close()
+                log.info("Database tables initialized successfully")
+                return True
+            except Exception as e:
+                # release_connection rolls back the failed transaction
+                log.error("Error initializing database: %s", e)
+                st.error(f"Error initializing database: {e}")
+    return False
+
+@st.cache_resource(show_spinner=False)
+def init_db_once():
+    """Run init_db a single time per server process instead of on every rerun"""
+    # Raising keeps st.cache_resource from caching a failed attempt, so the next run retries
+    if not init_db():
+        raise RuntimeError("Database initialization failed")
+    return True
+
+def ensure_db():
+    """init_db_once for the top of a page; on failure show an error and end this run"""
+    try:
+        init_db_once()
+    except RuntimeError:
+        st.error("The database isn't available right now. Please refresh the page in a moment.")
+        st.stop()
 
 def create_user(username, password):
-    conn = get_connection()
-    if conn:
-        try:
-            cur = conn.cursor()
-            hashed_pw = hash_password(password)
-            cur.execute("INSERT INTO users (username, password) VALUES (%s, %s) RETURNING id", (username, hashed_pw))
-            user_id = cur.fetchone()[0]
-            conn.commit()
-            cur.close()
-            conn.close()
-            return True, user_id
-        except Exception as e:
-            return False, str(e)
+    with pooled_connection() as conn:
+        if conn:
+            try:
+                cur = conn.cursor()
+                hashed_pw = hash_password(password)
+                cur.execute("INSERT INTO users (username, password) VALUES (%s, %s) RETURNING id", (username, hashed_pw))
+                user_id = cur.fetchone()[0]
+                conn.commit()
+                cur.close()
+                return True, user_id
+            except Exception as e:
+                return False, str(e)
     return False, "No connection"
 
 def verify_user(username, password):
-    conn = get_connection()
-    if conn:
+    with pooled_connection() as conn:
+        if conn:
+            cur = conn.cursor()
+            # Salted hashes can't be matched in SQL; fetch by username and check in Python
+            cur.execute("SELECT id, password FROM users WHERE username = %s", (username,))
+            user = cur.fetchone()
+            password_ok = check_password(password, user[1] if user else DUMMY_PASSWORD_HASH)
+            if user and password_ok:
+                if not user[1].startswith("$2"):
+                    # Upgrade a legacy SHA-256 hash now that we have the plaintext
+                    cur.execute("UPDATE users SET password = %s WHERE id = %s", (hash_password(password), user[0]))
+                    conn.commit()
+                cur.close()
+                return True, user[0]
+            cur.close()
+    return False, None
+
+# Batch size for server-side (named) cursors on unbounded history reads
+STREAM_ITERSIZE = 2000
+
+# Explicit dtypes for history columns, applied to every batch so a streamed read's batches agree
+# (a batch whose heart_rate or notes are all NULL would otherwise infer object and skew the concat)
+FRAME_DTYPES = {
+    'timestamp': 'datetime64[ns]', 'systolic': 'int64', 'diastolic': 'int64', 'heart_rate': 'float64',
+    'activity_type': 'object', 'duration': 'float64', 'intensity': 'object', 'calories': 'float64',
+    'notes': 'object'
+}
+
+def typed_frame(rows, columns):
+    """DataFrame from row tuples with FRAME_DTYPES applied to the columns it knows"""
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    return df.astype({col: FRAME_DTYPES[col] for col in columns if col in FRAME_DTYPES})
+
+def read_frame(conn, query, params, stream=False):
+    """Query into a DataFrame; stream=True pulls rows through a server-side cursor in STREAM_ITERSIZE batches"""
+    if not stream:
         cur = conn.cursor()
-        hashed_pw = hash_password(password)
-        cur.execute("SELECT id FROM users WHERE username = %s AND password = %s", (username, hashed_pw))
-        user = cur.fetchone()
+        cur.execute(query, params)
+        rows = cur.fetchall()
+        columns = [col[0] for col in cur.description]
         cur.close()
-        conn.close()
-        if user:
-            return True, user[0]
-    return False, None
+        return typed_frame(rows, columns)
+    cur = conn.cursor(name=f"stream_{uuid.uuid4().hex}")
+    cur.execute(query, params)
+    # Only one batch of row tuples is alive at a time; each is turned into a typed frame right away
+    chunks = []
+    while True:
+        batch = cur.fetchmany(STREAM_ITERSIZE)
+        if not batch:
+            break
+        chunks.append(typed_frame(batch, [col[0] for col in cur.description]))
+    columns = [col[0] for col in cur.description]
+    cur.close()
+    if not chunks:
+        return typed_frame([], columns)
+    return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+
+class DataUnavailable(Exception):
+    """A read couldn't reach the database. The readers raise it instead of returning an empty
+    result, because st.cache_data doesn't cache exceptions, so the next rerun retries the query"""
 
-def get_activity_data(user_id, limit=None):
+def load_or_stop(reader, *args, **kwargs):
+    """Call a cached reader for a page; on DataUnavailable show an error and end this run"""
     try:
-        conn = get_connection()
-        if conn:
-            import pandas as pd
-            query = "SELECT * FROM activities WHERE user_id = %s ORDER BY timestamp DESC"
-            if limit:
-                query += f" LIMIT {limit}"
-            df = pd.read_sql_query(query, conn, params=(str(user_id),))
-            conn.close()
-            if not df.empty:
-                df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True).dt.tz_localize(None)
-            return df
-    except Exception:
-        pass
-    return pd.DataFrame()
+        return reader(*args, **kwargs)
+    except DataUnavailable:
+        st.error("Couldn't load your data from the database. Please try again in a moment.")
+        st.stop()
+
+# PER-USER CACHE INVALIDATION
+# Cached reads are keyed on the user's write version of the tables they read, so a save only
+# orphans that user's entries (left to expire by TTL) instead of clearing every session's
+_version_counter = itertools.count(1)
+_data_versions = {}
+
+def bump_data_version(user_id, *tables):
+    """Invalidate user_id's cached reads of the given tables"""
+    for table in tables:
+        _data_versions[(table, int(user_id))] = next(_version_counter)
+
+def user_cache(*tables, ttl=60):
+    """st.cache_data for a get_cached_*(user_id, ...) reader of `tables`; data_version is filled in here"""
+    def decorator(func):
+        cached = st.cache_data(ttl=ttl, show_spinner=False)(func)
+        @functools.wraps(func)
+        def wrapper(user_id, *args, **kwargs):
+            version = tuple(_data_versions.get((table, int(user_id)), 0) for table in tables)
+            return cached(user_id, *args, data_version=version, **kwargs)
+        return wrapper
+    return decorator
+
+# Columns the pages read; notes is free text and only fetched for views that show it
+ACTIVITY_COLUMNS = "timestamp, activity_type, duration, intensity, calories"
+BLOOD_PRESSURE_COLUMNS = "timestamp, systolic, diastolic, heart_rate"
 
-def get_prediction_history(user_id):
-    """Fetches history for the dashboard chart specifically for Postgres/Supabase"""
+def get_activity_data(user_id, limit=None, with_notes=True, days=None):
     try:
-        conn = get_connection()
-        # Ensure we convert user_id to string to match the TEXT column type
-        user_id_str = str(user_id)
+        with pooled_connection() as conn:
+            if conn:
+                columns = ACTIVITY_COLUMNS + (", notes" if with_notes else "")
+                query = f"SELECT {columns} FROM activities WHERE user_id = %s"
+                params = [int(user_id)]
+                if days:
+                    query += " AND timestamp >= NOW() - INTERVAL '1 day' * %s"
+                    params.append(days)
+                # LIMIT is always a bound parameter (NULL means no limit), so the query text never varies
+                query += " ORDER BY timestamp DESC LIMIT %s"
+                params.append(int(limit) if limit else None)
+                df = read_frame(conn, query, tuple(params), stream=not limit)
+                if not df.empty:
+                    # timestamp is a naive TIMESTAMP column, so it already arrives as datetime64; no re-parse needed
+                    # Calendar day, projected once here instead of in every per-day aggregation
+                    df['date'] = df['timestamp'].values.astype('datetime64[D]')
+                    # Low-cardinality labels: integer codes make counts/groupbys/compares cheap
+                    df['activity_type'] = df['activity_type'].astype('category')
+                    df['intensity'] = df['intensity'].astype('category')
+                return df
+    except Exception as e:
+        log.error("Error fetching activity data: %s", e)
+        raise DataUnavailable(str(e)) from e
+    raise DataUnavailable("No database connection")
+
+@user_cache("activities")
+def get_cached_activity_data(user_id, data_version=None):
+    """Cached per-user activity history; invalidated whenever a new activity is saved"""
+    return get_activity_data(user_id)
+
+@user_cache("activities")
+def get_cached_recent_activities(user_id, n=5, with_notes=True, days=None, data_version=None):
+    """Cached newest-n activities (LIMIT query), optionally within the last `days` days; invalidated whenever a new activity is saved"""
+    return get_activity_data(user_id, limit=n, with_notes=with_notes, days=days)
+
+def get_activity_summary(user_id, week_start):
+    """Overall and current-week activity totals in a single aggregate query, as a dict"""
+    try:
+        with pooled_connection() as conn:
+            query = """
+                SELECT
+                    COUNT(*) as total_activities,
+                    COALESCE(SUM(duration), 0) as total_minutes,
+                    COALESCE(SUM(calories), 0) as total_calories,
+                    COALESCE(AVG(duration), 0) as avg_duration,
+                    COALESCE(SUM(duration) FILTER (WHERE timestamp >= %(week_start)s), 0) as week_minutes,
+                    COUNT(DISTINCT DATE(timestamp)) FILTER (WHERE timestamp >= %(week_start)s) as week_days_active
+                FROM activities
+                WHERE user_id = %(user_id)s
+            """
+            cur = conn.cursor()
+            cur.execute(query, {'user_id': int(user_id), 'week_start': week_start})
+            row = cur.fetchone()
+            columns = [col[0] for col in cur.description]
+            cur.close()
+            return dict(zip(columns, row))
+    except Exception as e:
+        log.error("Error getting activity summary: %s", e)
+        raise DataUnavailable(str(e)) from e
+
+@user_cache("activities")
+def get_cached_activity_summary(user_id, week_start, data_version=None):
+    """Cached get_activity_summary; invalidated whenever a new activity is saved"""
+    return get_activity_summary(user_id, week_start)
+
+# Newest predictions kept for the risk trend chart and recent-logs table
+PREDICTION_HISTORY_LIMIT = 1000
+
+def get_prediction_history(user_id, limit=PREDICTION_HISTORY_LIMIT):
+    """Fetches the newest `limit` predictions, oldest first, for the dashboard chart specifically for Postgres/Supabase"""
+    try:
+        with pooled_connection() as conn:
+            # user_id columns are INTEGER foreign keys to users.id
+            user_id = int(user_id)
         
-        # We select timestamp last so it maps correctly to our DataFrame in app.py
-        query = """
-            SELECT predicted_target, probability, timestamp 
-            FROM predictions_history 
-            WHERE user_id = %s 
-            ORDER BY timestamp ASC
-        """
+            # We select timestamp last so it maps correctly to our DataFrame in app.py
+            query = """
+                SELECT predicted_target, probability, timestamp FROM (
+                    SELECT predicted_target, probability, timestamp
+                    FROM predictions_history
+                    WHERE user_id = %s
+                    ORDER BY timestamp DESC
+                    LIMIT %s
+                ) recent
+                ORDER BY timestamp ASC
+            """
         
-        # Using a standard cursor to be safe
-        cur = conn.cursor()
-        cur.execute(query, (user_id_str,))
-        rows = cur.fetchall()
+            # Using a standard cursor to be safe
+            cur = conn.cursor()
+            cur.execute(query, (user_id, int(limit)))
+            rows = cur.fetchall()
         
-        cur.close()
-        conn.close()
-        return rows
+            cur.close()
+            return rows
     except Exception as e:
-        print(f"Database Fetch Error: {e}")
-        return []
+        log.error("Database Fetch Error: %s", e)
+        raise DataUnavailable(str(e)) from e
 
-def save_blood_pressure(user_id, systolic, diastolic, heart_rate=None, notes=None):
+@user_cache("predictions_history")
+def get_cached_prediction_history(user_id, data_version=None):
+    """Cached per-user prediction history; invalidated whenever a new prediction is logged"""
+    return get_prediction_history(user_id)
+
+def save_blood_pressure(user_id, systolic, diastolic, heart_rate=None, notes=None, conn=None):
+    """Insert a BP reading; returns the stored row as a dict, or False on failure"""
+    owns_transaction = conn is None
     if not user_id:
-        print("Error: user_id is None or empty")
+        log.error("user_id is None or empty")
         return False
     
     if systolic is None or diastolic is None:
-        print(f"Error: systolic or diastolic is None. systolic={systolic}, diastolic={diastolic}")
+        log.error("systolic or diastolic is None")
         return False
     
     try:
-        conn = get_connection()
-        if conn:
-            cur = conn.cursor()
-            cur.execute("""
-                INSERT INTO blood_pressure (user_id, systolic, diastolic, heart_rate, notes)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (str(user_id), systolic, diastolic, heart_rate, notes))
-            conn.commit()
-            cur.close()
-            conn.close()
-            print("Blood pressure saved successfully")
-            return True
-        else:
-            print("Failed to get database connection")
-            return False
+        with write_connection(conn) as conn:
+            if conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    INSERT INTO blood_pressure (user_id, systolic, diastolic, heart_rate, notes)
+                    VALUES (%s, %s, %s, %s, %s)
+                    RETURNING id, timestamp, systolic, diastolic, heart_rate, notes
+                """, (int(user_id), systolic, diastolic, heart_rate, notes))
+                row = cur.fetchone()
+                columns = [col[0] for col in cur.description]
+                if owns_transaction:
+                    conn.commit()
+                    # A caller-owned transaction invalidates after its own commit
+                    bump_data_version(user_id, "blood_pressure")
+                cur.close()
+                log.debug("Blood pressure saved successfully")
+                return dict(zip(columns, row))
+            else:
+                log.error("Failed to get database connection")
+                return False
     except Exception as e:
-        print(f"Error saving blood pressure: {e}")
-        print(f"Parameters: user_id={user_id}, systolic={systolic}, diastolic={diastolic}, heart_rate={heart_rate}, notes={notes}")
+        log.error("Error saving blood pressure: %s", e)
         return False
 
-def get_blood_pressure_data(user_id, limit=None):
+def copy_rows(table, columns, user_id, rows):
+    """COPY rows (tuples matching columns) for one user in a single statement; returns the row count, or False on failure"""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([int(user_id), *row])
+    buf.seek(0)
     try:
-        conn = get_connection()
-        if conn:
-            import pandas as pd
-            query = "SELECT * FROM blood_pressure WHERE user_id = %s ORDER BY timestamp DESC"
-            if limit:
-                query += f" LIMIT {limit}"
-            df = pd.read_sql_query(query, conn, params=(str(user_id),))
-            conn.close()
-            if not df.empty:
-                df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True).dt.tz_localize(None)
-            return df
+        with pooled_connection() as conn:
+            if conn:
+                cur = conn.cursor()
+                # COPY skips the per-row parse/plan of individual INSERTs
+                cur.copy_expert(f"COPY {table} (user_id, {', '.join(columns)}) FROM STDIN WITH CSV", buf)
+                count = cur.rowcount
+                conn.commit()
+                cur.close()
+                log.debug("Imported %s rows into %s", count, table)
+                return count
     except Exception as e:
-        print(f"Error fetching blood pressure data: {e}")
-    return pd.DataFrame()
+        log.error("Error importing into %s: %s", table, e)
+    return False
+
+def bulk_insert_blood_pressure(user_id, rows):
+    """COPY many (timestamp, systolic, diastolic, heart_rate, notes) rows; returns the row count, or False on failure"""
+    count = copy_rows("blood_pressure", ("timestamp", "systolic", "diastolic", "heart_rate", "notes"), user_id, rows)
+    if count is not False:
+        bump_data_version(user_id, "blood_pressure")
+    return count
+
+def get_blood_pressure_data(user_id, limit=None, days=None, with_notes=True):
+    try:
+        with pooled_connection() as conn:
+            if conn:
+                columns = BLOOD_PRESSURE_COLUMNS + (", notes" if with_notes else "")
+                query = f"SELECT {columns} FROM blood_pressure WHERE user_id = %s"
+                params = [int(user_id)]
+                if days:
+                    # Let the (user_id, timestamp) index do the range scan
+                    query += " AND timestamp >= NOW() - INTERVAL '1 day' * %s"
+                    params.append(days)
+                query += " ORDER BY timestamp DESC LIMIT %s"
+                params.append(int(limit) if limit else None)
+                # timestamp is a naive TIMESTAMP column, so it already arrives as datetime64
+                return read_frame(conn, query, tuple(params), stream=not limit)
+    except Exception as e:
+        log.error("Error fetching blood pressure data: %s", e)
+        raise DataUnavailable(str(e)) from e
+    raise DataUnavailable("No database connection")
 
-def save_activity(user_id, activity_type, duration, intensity, calories, notes=None):
+@user_cache("blood_pressure")
+def get_cached_blood_pressure_data(user_id, data_version=None):
+    """Cached per-user BP history; invalidated whenever a new reading is saved"""
+    return get_blood_pressure_data(user_id)
+
+def save_activity(user_id, activity_type, duration, intensity, calories, notes=None, conn=None):
+    owns_transaction = conn is None
     if not user_id:
-        print("Error: user_id is None or empty")
+        log.error("user_id is None or empty")
         return False
     
     if not activity_type or duration is None or not intensity or calories is None:
-        print(f"Error: required fields are None. activity_type={activity_type}, duration={duration}, intensity={intensity}, calories={calories}")
+        log.error("required fields are None")
         return False
     
     try:
-        conn = get_connection()
-        if conn:
-            cur = conn.cursor()
-            cur.execute("""
-                INSERT INTO activities (user_id, activity_type, duration, intensity, calories, notes)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (str(user_id), activity_type, duration, intensity, calories, notes))
-            conn.commit()
-            cur.close()
-            conn.close()
-            print("Activity saved successfully")
-            return True
-        else:
-            print("Failed to get database connection")
-            return False
+        with write_connection(conn) as conn:
+            if conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    INSERT INTO activities (user_id, activity_type, duration, intensity, calories, notes)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, (int(user_id), activity_type, duration, intensity, calories, notes))
+                if owns_transaction:
+                    conn.commit()
+                    bump_data_version(user_id, "activities")
+                cur.close()
+                log.debug("Activity saved successfully")
+                return True
+            else:
+                log.error("Failed to get database connection")
+                return False
     except Exception as e:
-        print(f"Error saving activity: {e}")
-        print(f"Parameters: user_id={user_id}, activity_type={activity_type}, duration={duration}, intensity={intensity}, calories={calories}, notes={notes}")
+        log.error("Error saving activity: %s", e)
         return False
 
+def bulk_insert_activities(user_id, rows):
+    """COPY many (timestamp, activity_type, duration, intensity, calories, notes) rows; returns the row count, or False on failure"""
+    count = copy_rows("activities", ("timestamp", "activity_type", "duration", "intensity", "calories", "notes"), user_id, rows)
+    if count is not False:
+        bump_data_version(user_id, "activities")
+    return count
+
 def log_prediction_to_db(user_id, age, chol, bp, prediction, probability):
-    conn = get_connection()
-    if conn:
-        try:
-            cur = conn.cursor()
-            cur.execute("""
-                INSERT INTO predictions_history (user_id, age, cholesterol, resting_bp_s, predicted_target, probability)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (str(user_id), age, chol, bp, prediction, probability))
-            conn.commit()
-            cur.close()
-            conn.close()
-            return True
-        except Exception as e:
-            print(f"Error logging prediction: {e}")
-            return False
+    with pooled_connection() as conn:
+        if conn:
+            try:
+                cur = conn.cursor()
+                cur.execute("""
+                    INSERT INTO predictions_history (user_id, age, cholesterol, resting_bp_s, predicted_target, probability)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, (int(user_id), age, chol, bp, prediction, probability))
+                conn.commit()
+                cur.close()
+                bump_data_version(user_id, "predictions_history")
+                return True
+            except Exception as e:
+                log.error("Error logging prediction: %s", e)
+                return False
     return False
 
-def save_cholesterol(user_id, total_chol=None, ldl=None, hdl=None, triglycerides=None, notes=None):
-    conn = get_connection()
-    if conn:
-        try:
-            cur = conn.cursor()
-            cur.execute("""
-                INSERT INTO cholesterol_readings (user_id, total_cholesterol, ldl, hdl, triglycerides, notes)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (str(user_id), total_chol, ldl, hdl, triglycerides, notes))
-            conn.commit()
-            cur.close()
-            conn.close()
-            return True
-        except Exception as e:
-            print(f"Error saving cholesterol: {e}")
-            return False
+def save_cholesterol(user_id, total_chol=None, ldl=None, hdl=None, triglycerides=None, notes=None, conn=None):
+    owns_transaction = conn is None
+    with write_connection(conn) as conn:
+        if conn:
+            try:
+                cur = conn.cursor()
+                cur.execute("""
+                    INSERT INTO cholesterol_readings (user_id, total_cholesterol, ldl, hdl, triglycerides, notes)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, (int(user_id), total_chol, ldl, hdl, triglycerides, notes))
+                if owns_transaction:
+                    conn.commit()
+                cur.close()
+                return True
+            except Exception as e:
+                log.error("Error saving cholesterol: %s", e)
+                return False
     return False
 
+# Chat lines are not health data: a server crash may drop the last few hundred ms of them,
+# so their commit does not wait for the WAL flush
+ASYNC_COMMIT_SQL = "SET LOCAL synchronous_commit = OFF;"
+
 def save_chat_message(user_id, role, message):
-    conn = get_connection()
-    if conn:
-        try:
-            cur = conn.cursor()
-            cur.execute("""
-                INSERT INTO chat_history (user_id, role, message)
-                VALUES (%s, %s, %s)
-            """, (str(user_id), role, message))
-            conn.commit()
-            cur.close()
-            conn.close()
-            return True
-        except Exception as e:
-            print(f"Error saving chat message: {e}")
-            return False
+    with pooled_connection() as conn:
+        if conn:
+            try:
+                cur = conn.cursor()
+                cur.execute(ASYNC_COMMIT_SQL + """
+                    INSERT INTO chat_history (user_id, role, message)
+                    VALUES (%s, %s, %s)
+                """, (int(user_id), role, message))
+                conn.commit()
+                cur.close()
+                return True
+            except Exception as e:
+                log.error("Error saving chat message: %s", e)
+                return False
     return False
 
-def load_chat_history(user_id):
-    try:
-        conn = get_connection()
+def save_chat_messages(user_id, messages, conn=None):
+    """Insert several (role, message) pairs as one multi-row INSERT and a single commit"""
+    owns_transaction = conn is None
+    with write_connection(conn) as conn:
         if conn:
-            import pandas as pd
-            query = "SELECT role, message, timestamp FROM chat_history WHERE user_id = %s ORDER BY timestamp ASC"
-            df = pd.read_sql_query(query, conn, params=(str(user_id),))
-            conn.close()
-            if not df.empty:
-                df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True).dt.tz_localize(None)
-                # Convert DataFrame to list of dicts with 'content' instead of 'message'
-                chat_list = df[['role', 'message']].rename(columns={'message': 'content'}).to_dict('records')
-                print(f"Loaded {len(chat_list)} chat messages for user {user_id}")
+            try:
+                cur = conn.cursor()
+                # Only relax durability when the transaction holds nothing but chat lines; a reading
+                # logged earlier in the same chat turn keeps its synchronous commit
+                chat_only = conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+                # executemany would still send one statement per row; execute_values sends one
+                psycopg2.extras.execute_values(cur, (ASYNC_COMMIT_SQL if chat_only else "") + """
+                    INSERT INTO chat_history (user_id, role, message)
+                    VALUES %s
+                """, [(int(user_id), role, message) for role, message in messages])
+                if owns_transaction:
+                    conn.commit()
+                    bump_data_version(user_id, "chat_history")
+                cur.close()
+                return True
+            except Exception as e:
+                log.error("Error saving chat messages: %s", e)
+                return False
+    return False
+
+def load_chat_history(user_id, limit=None):
+    """Chat messages oldest-first; with limit, only the most recent `limit` messages"""
+    try:
+        with pooled_connection() as conn:
+            if conn:
+                params = (int(user_id),)
+                query = "SELECT role, message FROM chat_history WHERE user_id = %s ORDER BY timestamp ASC, id ASC"
+                if limit:
+                    query = """
+                        SELECT role, message FROM (
+                            SELECT id, role, message, timestamp FROM chat_history
+                            WHERE user_id = %s ORDER BY timestamp DESC, id DESC LIMIT %s
+                        ) recent ORDER BY timestamp ASC, id ASC
+                    """
+                    params = (int(user_id), int(limit))
+                cur = conn.cursor()
+                cur.execute(query, params)
+                # Small result set: build the message dicts directly, no DataFrame round-trip
+                chat_list = [{"role": role, "content": message} for role, message in cur.fetchall()]
+                cur.close()
+                log.debug("Loaded %s chat messages for user %s", len(chat_list), user_id)
                 return chat_list
-            return []
     except Exception as e:
-        print(f"Error loading chat history: {e}")
-    return []
+        log.error("Error loading chat history: %s", e)
+        raise DataUnavailable(str(e)) from e
+    raise DataUnavailable("No database connection")
+
+@user_cache("chat_history")
+def get_cached_chat_history(user_id, limit=None, data_version=None):
+    """Cached load_chat_history; invalidated whenever new chat messages are saved"""
+    return load_chat_history(user_id, limit)
+
+def get_weekly_bp_average(user_id):
+    """Average (systolic, diastolic) over the last 7 days, or None when there are no readings"""
+    try:
+        with pooled_connection() as conn:
+            if conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    SELECT AVG(systolic), AVG(diastolic)
+                    FROM blood_pressure
+                    WHERE user_id = %s AND timestamp >= CURRENT_DATE - INTERVAL '7 days'
+                """, (int(user_id),))
+                row = cur.fetchone()
+                cur.close()
+                if row and row[0] is not None:
+                    return float(row[0]), float(row[1])
+                return None
+    except Exception as e:
+        log.error("Error getting weekly BP average: %s", e)
+        raise DataUnavailable(str(e)) from e
+    raise DataUnavailable("No database connection")
+
+@user_cache("blood_pressure", ttl=300)
+def get_cached_weekly_bp_average(user_id, data_version=None):
+    """Cached get_weekly_bp_average; invalidated whenever a new BP reading is saved"""
+    return get_weekly_bp_average(user_id)
 
 def get_weekly_bp_summary(user_id):
     try:
-        conn = get_connection()
-        if conn:
-            import pandas as pd
+        with pooled_connection() as conn:
+            if conn:
+                query = """
+                    SELECT 
+                        DATE(timestamp)::timestamp as date,
+                        AVG(systolic) as avg_systolic,
+                        AVG(diastolic) as avg_diastolic,
+                        MIN(systolic) as min_systolic,
+                        MAX(systolic) as max_systolic,
+                        MIN(diastolic) as min_diastolic,
+                        MAX(diastolic) as max_diastolic,
+                        COUNT(*) as readings_count
+                    FROM blood_pressure 
+                    WHERE user_id = %s AND timestamp >= CURRENT_DATE - INTERVAL '7 days'
+                    GROUP BY DATE(timestamp)
+                    ORDER BY date ASC
+                """
+                # date is cast to timestamp in SQL so it arrives as datetime64 directly
+                return pd.read_sql_query(query, conn, params=(int(user_id),))
+    except Exception as e:
+        log.error("Error getting weekly BP summary: %s", e)
+        raise DataUnavailable(str(e)) from e
+    raise DataUnavailable("No database connection")
+
+def get_blood_pressure_daily(user_id, days=30):
+    """Daily average systolic BP over the last `days` days, aggregated in SQL"""
+    try:
+        with pooled_connection() as conn:
+            if conn:
+                query = """
+                    SELECT 
+                        date_trunc('day', timestamp) as day,
+                        AVG(systolic) as systolic
+                    FROM blood_pressure 
+                    WHERE user_id = %s AND timestamp >= NOW() - INTERVAL '1 day' * %s
+                    GROUP BY 1
+                    ORDER BY 1 ASC
+                """
+                df = pd.read_sql_query(query, conn, params=(int(user_id), days), parse_dates=['day'])
+                return df
+    except Exception as e:
+        log.error("Error getting daily BP data: %s", e)
+        raise DataUnavailable(str(e)) from e
+    raise DataUnavailable("No database connection")
+
+def get_activity_daily(user_id, days=30):
+    """Daily total activity minutes over the last `days` days, aggregated in SQL"""
+    try:
+        with pooled_connection() as conn:
+            if conn:
+                query = """
+                    SELECT 
+                        date_trunc('day', timestamp) as day,
+                        SUM(duration) as duration
+                    FROM activities 
+                    WHERE user_id = %s AND timestamp >= NOW() - INTERVAL '1 day' * %s
+                    GROUP BY 1
+                    ORDER BY 1 ASC
+                """
+                df = pd.read_sql_query(query, conn, params=(int(user_id), days), parse_dates=['day'])
+                return df
+    except Exception as e:
+        log.error("Error getting daily activity data: %s", e)
+        raise DataUnavailable(str(e)) from e
+    raise DataUnavailable("No database connection")
+
+def get_dashboard_summary(user_id, days=30):
+    """Headline dashboard metrics in a single aggregate query, as a dict"""
+    try:
+        with pooled_connection() as conn:
             query = """
-                SELECT 
-                    DATE(timestamp) as date,
-                    AVG(systolic) as avg_systolic,
-                    AVG(diastolic) as avg_diastolic,
-                    MIN(systolic) as min_systolic,
-                    MAX(systolic) as max_systolic,
-                    MIN(diastolic) as min_diastolic,
-                    MAX(diastolic) as max_diastolic,
-                    COUNT(*) as readings_count
-                FROM blood_pressure 
-                WHERE user_id = %s AND timestamp >= CURRENT_DATE - INTERVAL '7 days'
-                GROUP BY DATE(timestamp)
-                ORDER BY date ASC
+                WITH bp AS (
+                    SELECT systolic, diastolic, timestamp
+                    FROM blood_pressure
+                    WHERE user_id = %(user_id)s AND timestamp >= NOW() - INTERVAL '1 day' * %(days)s
+                ), act AS (
+                    SELECT
+                        COUNT(*) as activity_count,
+                        COALESCE(SUM(duration) FILTER (WHERE timestamp >= NOW() - INTERVAL '7 days'), 0) as weekly_minutes
+                    FROM activities
+                    WHERE user_id = %(user_id)s AND timestamp >= NOW() - INTERVAL '1 day' * %(days)s
+                )
+                SELECT
+                    (SELECT COUNT(*) FROM bp) as bp_count,
+                    act.activity_count,
+                    act.weekly_minutes,
+                    latest.systolic as latest_systolic,
+                    latest.diastolic as latest_diastolic
+                FROM act
+                LEFT JOIN LATERAL (
+                    SELECT systolic, diastolic FROM bp ORDER BY timestamp DESC LIMIT 1
+                ) latest ON TRUE
             """
-            df = pd.read_sql_query(query, conn, params=(str(user_id),))
-            conn.close()
-            if not df.empty:
-                df['date'] = pd.to_datetime(df['date'], utc=True).dt.tz_localize(None)
-            return df
+            cur = conn.cursor()
+            cur.execute(query, {'user_id': int(user_id), 'days': days})
+            row = cur.fetchone()
+            columns = [col[0] for col in cur.description]
+            cur.close()
+            return dict(zip(columns, row))
     except Exception as e:
-        print(f"Error getting weekly BP summary: {e}")
-    return pd.DataFrame()
\ No newline at end of file
+        log.error("Error getting dashboard summary: %s", e)
+        raise DataUnavailable(str(e)) from e
+
+# CACHED READS for the dashboard; writers invalidate them through bump_data_version
+@user_cache("blood_pressure", "activities")
+def get_cached_dashboard_summary(user_id, days=30, data_version=None):
+    return get_dashboard_summary(user_id, days)
+
+@user_cache("blood_pressure")
+def get_cached_blood_pressure_daily(user_id, days=30, data_version=None):
+    return get_blood_pressure_daily(user_id, days)
+
+@user_cache("activities")
+def get_cached_activity_daily(user_id, days=30, data_version=None):
+    return get_activity_daily(user_id, days)
+
+@user_cache("blood_pressure")
+def get_cached_recent_blood_pressure(user_id, n=10, days=30, data_version=None):
+    return get_blood_pressure_data(user_id, limit=n, days=days, with_notes=False)
+
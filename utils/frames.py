@@ -0,0 +1,9 @@
+# Helpers for the newest-first history frames the cached readers return
+import numpy as np
+
+def slice_since(df, cutoff):
+    """Rows at or after cutoff from a newest-first frame, found by binary search"""
+    # Reversed view is ascending; count how many timestamps fall before the cutoff
+    ts_ascending = df['timestamp'].values[::-1]
+    n_older = np.searchsorted(ts_ascending, np.datetime64(cutoff), side='left')
+    return df.iloc[:len(df) - n_older]
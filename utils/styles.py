@@ -0,0 +1,28 @@
+# Shared page styles. Built once at import (this module is not re-executed on
+# Streamlit reruns) and whitespace-collapsed to keep the per-rerun payload small.
+
+def _minify(css):
+    return " ".join(css.split())
+
+APP_CSS = "<style>" + _minify("""
+    .main-header {
+        font-size: 2.5rem;
+        font-weight: bold;
+        color: #1f77b4;
+        text-align: center;
+        margin-bottom: 2rem;
+        margin-top: 1rem;
+    }
+    .metric-card {
+        background-color: #f0f2f6;
+        padding: 1rem;
+        border-radius: 0.5rem;
+        margin: 0.5rem 0;
+    }
+    .sidebar .sidebar-content {
+        padding-top: 1rem;
+    }
+    .stImage {
+        margin-bottom: 1rem;
+    }
+""") + "</style>"